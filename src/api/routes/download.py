@@ -2,41 +2,67 @@ from fastapi import APIRouter, HTTPException, Response
 from fastapi.responses import FileResponse
 from pathlib import Path
 from typing import Dict, Any
+import os
 
-from ...config.settings import settings
+from ...config.settings import settings, OUTPUT_DIR
 
 router = APIRouter()
 
+def _offload_response(path: Path, filename: str, media_type: str) -> Response:
+    """本文を返さず、ファイル送出をリバースプロキシ（nginx等）のsendfileに任せる"""
+    if settings.download_offload_prefix:
+        location = f"{settings.download_offload_prefix.rstrip('/')}/{path.name}"
+    else:
+        location = str(path.resolve())
+
+    return Response(
+        media_type=media_type,
+        headers={
+            settings.download_offload_header: location,
+            "Content-Disposition": f'attachment; filename="{filename}"'
+        }
+    )
+
+def _file_response(path: Path, filename: str, media_type: str, not_found: str) -> Response:
+    """ファイルを返す（statは1回だけ行い、結果をFileResponseに渡して再statを避ける）"""
+    try:
+        stat_result = os.stat(path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=not_found)
+
+    # 大きな動画の全バイトをPythonで読み書きしないよう、設定があればプロキシに委譲する
+    if settings.download_offload_header:
+        return _offload_response(path, filename, media_type)
+
+    return FileResponse(
+        path=path,
+        filename=filename,
+        media_type=media_type,
+        stat_result=stat_result
+    )
+
 @router.get("/download/{job_id}/video")
-async def download_video(job_id: str) -> FileResponse:
+async def download_video(job_id: str) -> Response:
     """
     生成された動画をダウンロード
     """
-    video_path = Path(settings.output_dir) / f"{job_id}.mp4"
-    
-    if not video_path.exists():
-        raise HTTPException(status_code=404, detail="Video not found or not ready")
-    
-    return FileResponse(
-        path=video_path,
+    return _file_response(
+        OUTPUT_DIR / f"{job_id}.mp4",
         filename=f"math_video_{job_id}.mp4",
-        media_type="video/mp4"
+        media_type="video/mp4",
+        not_found="Video not found or not ready"
     )
 
 @router.get("/download/{job_id}/slides")
-async def download_slides(job_id: str) -> FileResponse:
+async def download_slides(job_id: str) -> Response:
     """
     生成されたスライド（PDF）をダウンロード
     """
-    slides_path = Path(settings.output_dir) / f"{job_id}_slides.pdf"
-    
-    if not slides_path.exists():
-        raise HTTPException(status_code=404, detail="Slides not found")
-    
-    return FileResponse(
-        path=slides_path,
+    return _file_response(
+        OUTPUT_DIR / f"{job_id}_slides.pdf",
         filename=f"slides_{job_id}.pdf",
-        media_type="application/pdf"
+        media_type="application/pdf",
+        not_found="Slides not found"
     )
 
 @router.get("/download/{job_id}/info")
@@ -44,12 +70,17 @@ async def get_download_info(job_id: str) -> Dict[str, Any]:
     """
     ダウンロード可能なファイル情報を取得
     """
-    output_dir = Path(settings.output_dir)
+    # 成果物ごとにstatせず、ディレクトリを1回走査して名前の集合で判定する
+    try:
+        with os.scandir(OUTPUT_DIR) as entries:
+            names = {entry.name for entry in entries}
+    except FileNotFoundError:
+        names = set()
     
     files = {
-        "video": (output_dir / f"{job_id}.mp4").exists(),
-        "slides": (output_dir / f"{job_id}_slides.pdf").exists(),
-        "audio": (output_dir / f"{job_id}_audio.wav").exists()
+        "video": f"{job_id}.mp4" in names,
+        "slides": f"{job_id}_slides.pdf" in names,
+        "audio": f"{job_id}_audio.wav" in names
     }
     
     return {
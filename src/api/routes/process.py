@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Dict, Any, Optional
 
@@ -6,6 +6,7 @@ from ...config.settings import settings
 from ...core.slide_generator import SlideGenerator
 from ...core.video_generator import VideoGenerator
 from ...core.tts_engine import TTSEngine
+from ...worker import render_job
 
 router = APIRouter()
 
@@ -20,8 +21,7 @@ class ProcessingConfig(BaseModel):
 @router.post("/process/{job_id}")
 async def start_processing(
     job_id: str,
-    config: ProcessingConfig,
-    background_tasks: BackgroundTasks
+    config: ProcessingConfig
 ) -> Dict[str, Any]:
     """
     動画生成処理を開始
@@ -29,12 +29,8 @@ async def start_processing(
     # 実際の実装ではデータベースからジョブ情報を取得
     # ここでは簡単な例を示す
     
-    # バックグラウンドタスクとして処理を開始
-    background_tasks.add_task(
-        process_document_to_video,
-        job_id,
-        config
-    )
+    # Webワーカーで実行せず、キュー経由で専用のレンダリングワーカーに渡す
+    render_job.delay(job_id, config.dict())
     
     return {
         "job_id": job_id,
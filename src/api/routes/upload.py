@@ -1,26 +1,95 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
 from pathlib import Path
+import asyncio
+import os
+import sys
 import uuid
-import shutil
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, Any
 
 from ...config.settings import settings
 from ...core.document_parser import DocumentParser
 from ...models.document import Document, DocumentType, ProcessingStatus
+from ...utils.buffer_pool import BufferPool
 
 router = APIRouter()
 
+# アップロード保存時のコピー単位（1MiB単位でsyscall回数を減らす）
+_COPY_BUFSIZE = 1024 * 1024
+
+# アップロード書き込み専用のスレッドプール
+# TTS合成などが使う既定のexecutorと分け、長時間処理にI/Oが待たされないようにする
+_IO_EXECUTOR = ThreadPoolExecutor(
+    max_workers=settings.io_workers,
+    thread_name_prefix="upload-io"
+)
+
+# コピー用バッファはリクエストごとに確保せず、同時書き込み数ぶんを使い回す
+_BUFFER_POOL = BufferPool(size=_COPY_BUFSIZE, count=settings.io_workers)
+
+# ファイル同士のsendfile(2)はLinuxのみ対応
+_FILE_SENDFILE_SUPPORTED = sys.platform.startswith("linux")
+
+def _too_large() -> HTTPException:
+    """ファイルサイズ超過(413)の例外を生成"""
+    return HTTPException(
+        status_code=413,
+        detail=f"File too large. Maximum size: {settings.max_file_size} bytes"
+    )
+
+def _sendfile_copy(src: BinaryIO, dst: BinaryIO) -> None:
+    """sendfileでカーネル内コピー（ユーザー空間にデータを読み込まない）"""
+    src_fd = src.fileno()
+    dst_fd = dst.fileno()
+    offset = src.tell()
+    size = os.fstat(src_fd).st_size
+    
+    # 実ファイルなので実際のサイズでコピー前に判定できる
+    if size - offset > settings.max_file_size:
+        raise _too_large()
+    
+    while offset < size:
+        sent = os.sendfile(dst_fd, src_fd, offset, size - offset)
+        if sent == 0:
+            break
+        offset += sent
+
+def _buffered_copy(src: BinaryIO, dst: BinaryIO) -> None:
+    """プールから借りたバッファにreadintoしながらコピー（書き込み量で上限を検証）"""
+    written = 0
+    with _BUFFER_POOL.buffer() as buf, memoryview(buf) as view:
+        while True:
+            n = src.readinto(buf)
+            if not n:
+                break
+            written += n
+            if written > settings.max_file_size:
+                raise _too_large()
+            dst.write(view[:n])
+
+def _save_upload(src: BinaryIO, file_path: Path) -> None:
+    """アップロードファイルをディスクに書き出す（ワーカースレッドで実行）"""
+    try:
+        with open(file_path, "wb") as buffer:
+            # SpooledTemporaryFileが実ファイルにロールオーバー済みならsendfileを使う
+            # （メモリ上のままの場合にfileno()を呼ぶとロールオーバーが起きるため確認してから）
+            if _FILE_SENDFILE_SUPPORTED and getattr(src, "_rolled", False):
+                _sendfile_copy(src, buffer)
+            else:
+                _buffered_copy(src, buffer)
+    except BaseException:
+        # 上限超過や書き込み失敗時に途中までのファイルを残さない
+        file_path.unlink(missing_ok=True)
+        raise
+
 @router.post("/upload")
 async def upload_file(file: UploadFile = File(...)) -> Dict[str, Any]:
     """
     ファイルをアップロードして解析を開始
     """
-    # ファイルサイズチェック
-    if file.size > settings.max_file_size:
-        raise HTTPException(
-            status_code=413,
-            detail=f"File too large. Maximum size: {settings.max_file_size} bytes"
-        )
+    # ファイルサイズチェック（sizeは申告値なので、保存時にも実際のバイト数で検証する）
+    if file.size is not None and file.size > settings.max_file_size:
+        raise _too_large()
     
     # ファイル形式チェック
     allowed_extensions = [".pdf", ".tex", ".md"]
@@ -39,10 +108,12 @@ async def upload_file(file: UploadFile = File(...)) -> Dict[str, Any]:
     # ディレクトリ作成
     file_path.parent.mkdir(parents=True, exist_ok=True)
     
-    # ファイル保存
+    # ファイル保存（ブロッキングI/Oはスレッドで実行し、イベントループを止めない）
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(_IO_EXECUTOR, _save_upload, file.file, file_path)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
     
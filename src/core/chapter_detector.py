@@ -4,6 +4,18 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# 空行を除いた各行（行リストを作らずにテキストを走査するため）
+_LINE_RE = re.compile(r'[^\n]+')
+
+# 章の直下に入る要素と、節（なければ章）の直下に入る要素
+_SECTION_TYPES = frozenset({'section', 'theorem', 'lemma', 'example'})
+_SUBSECTION_TYPES = frozenset({'subsection', 'proof'})
+
+# 1行あたりの平均時間を推定（読み上げ速度から）
+# 平均的な読み上げ速度: 150-200 words/minute
+# 日本語: 約300-400文字/minute
+_SECONDS_PER_LINE = 2.0
+
 class ChapterDetector:
     """文書のチャプター構造を自動検出するクラス"""
     
@@ -34,6 +46,20 @@ class ChapterDetector:
             (r'^\\subsection\{(.+)\}', 'subsection', 3),
             (r'^\\subsubsection\{(.+)\}', 'subsubsection', 4),
         ]
+        
+        # パターンは一度だけコンパイルし、全パターンを1つの選択肢(alternation)に
+        # まとめることで1行あたり1回のmatchで該当パターンを特定する
+        self._compiled = [
+            (re.compile(pattern, re.IGNORECASE), chapter_type, level)
+            for pattern, chapter_type, level in self.chapter_patterns
+        ]
+        self._combined = re.compile(
+            '|'.join(
+                f'(?P<a{i}>{pattern})'
+                for i, (pattern, _, _) in enumerate(self.chapter_patterns)
+            ),
+            re.IGNORECASE
+        )
     
     def detect_chapters(self, text: str, source_type: str = 'text') -> List[Dict]:
         """
@@ -46,45 +72,91 @@ class ChapterDetector:
         Returns:
             チャプター情報のリスト
         """
-        chapters = []
-        lines = text.split('\n')
+        organized = []
+        current_chapter = None
+        current_section = None
+        # タイムスタンプが未確定のトップレベル要素（次のトップレベル要素の開始行で確定）
+        pending = None
+        
+        # 行リストは作らず、マッチ間の改行数から行番号を求める
+        line_no = 0
+        last_pos = 0
         
-        for line_no, line in enumerate(lines):
-            line = line.strip()
+        # パターンの照合・階層構造の整理・タイムスタンプの推定を1パスで行う
+        for line_match in _LINE_RE.finditer(text):
+            start = line_match.start()
+            line_no += text.count('\n', last_pos, start)
+            last_pos = start
+            
+            line = line_match.group().strip()
             if not line:
                 continue
             
-            chapter_info = self._match_chapter_pattern(line, line_no)
-            if chapter_info:
-                chapters.append(chapter_info)
-        
-        # チャプターの階層構造を整理
-        chapters = self._organize_hierarchy(chapters)
+            chapter = self._match_chapter_pattern(line, line_no)
+            if not chapter:
+                continue
+            
+            chapter_type = chapter['type']
+            if chapter_type == 'chapter':
+                current_chapter = chapter
+                current_section = None
+                chapter['children'] = []
+                
+            elif chapter_type in _SECTION_TYPES:
+                if current_chapter:
+                    current_chapter['children'].append(chapter)
+                    current_section = chapter
+                    chapter['parent'] = current_chapter['title']
+                    continue
+                
+            elif chapter_type in _SUBSECTION_TYPES:
+                if current_section:
+                    current_section.setdefault('children', []).append(chapter)
+                    chapter['parent'] = current_section['title']
+                    continue
+                if current_chapter:
+                    current_chapter['children'].append(chapter)
+                    chapter['parent'] = current_chapter['title']
+                    continue
+                
+            else:
+                # subsubsection は階層に含めない
+                continue
+            
+            # ビデオ用のタイムスタンプはトップレベル要素にのみ付与する
+            if pending is not None:
+                self._set_timestamps(pending, line_no)
+            organized.append(chapter)
+            pending = chapter
         
-        # ビデオ用のタイムスタンプを推定
-        chapters = self._estimate_timestamps(chapters, len(lines))
+        if pending is not None:
+            self._set_timestamps(pending, text.count('\n') + 1)
         
-        logger.info(f"Detected {len(chapters)} chapters/sections")
-        return chapters
+        logger.info(f"Detected {len(organized)} chapters/sections")
+        return organized
     
     def _match_chapter_pattern(self, line: str, line_no: int) -> Dict:
         """行がチャプターパターンにマッチするかチェック"""
-        for pattern, chapter_type, level in self.chapter_patterns:
-            match = re.match(pattern, line, re.IGNORECASE)
-            if match:
-                title = self._extract_title(match, chapter_type)
-                number = self._extract_number(match, chapter_type)
-                
-                return {
-                    'title': title,
-                    'type': chapter_type,
-                    'level': level,
-                    'number': number,
-                    'line_number': line_no,
-                    'original_text': line
-                }
+        combined_match = self._combined.match(line)
+        if not combined_match:
+            return None
+        
+        # 外側の名前付きグループ(a{i})がどのパターンにマッチしたかを示す
+        pattern, chapter_type, level = self._compiled[int(combined_match.lastgroup[1:])]
         
-        return None
+        # キャプチャグループの番号を揃えるため個別パターンで再マッチ
+        match = pattern.match(line)
+        title = self._extract_title(match, chapter_type)
+        number = self._extract_number(match, chapter_type)
+        
+        return {
+            'title': title,
+            'type': chapter_type,
+            'level': level,
+            'number': number,
+            'line_number': line_no,
+            'original_text': line
+        }
     
     def _extract_title(self, match, chapter_type: str) -> str:
         """マッチオブジェクトからタイトルを抽出"""
@@ -107,69 +179,11 @@ class ChapterDetector:
         # 最初のグループが番号であることが多い
         return groups[0].strip()
     
-    def _organize_hierarchy(self, chapters: List[Dict]) -> List[Dict]:
-        """チャプターの階層構造を整理"""
-        organized = []
-        current_chapter = None
-        current_section = None
-        
-        for chapter in chapters:
-            chapter_copy = chapter.copy()
-            
-            if chapter['type'] == 'chapter':
-                current_chapter = chapter_copy
-                current_section = None
-                chapter_copy['children'] = []
-                organized.append(chapter_copy)
-                
-            elif chapter['type'] in ['section', 'theorem', 'lemma', 'example']:
-                if current_chapter:
-                    current_chapter['children'].append(chapter_copy)
-                    current_section = chapter_copy
-                    chapter_copy['parent'] = current_chapter['title']
-                else:
-                    organized.append(chapter_copy)
-                    
-            elif chapter['type'] in ['subsection', 'proof']:
-                if current_section:
-                    if 'children' not in current_section:
-                        current_section['children'] = []
-                    current_section['children'].append(chapter_copy)
-                    chapter_copy['parent'] = current_section['title']
-                elif current_chapter:
-                    current_chapter['children'].append(chapter_copy)
-                    chapter_copy['parent'] = current_chapter['title']
-                else:
-                    organized.append(chapter_copy)
-        
-        return organized
-    
-    def _estimate_timestamps(self, chapters: List[Dict], total_lines: int) -> List[Dict]:
-        """各チャプターの推定タイムスタンプを計算"""
-        if not chapters:
-            return chapters
-        
-        # 1行あたりの平均時間を推定（読み上げ速度から）
-        # 平均的な読み上げ速度: 150-200 words/minute
-        # 日本語: 約300-400文字/minute
-        estimated_duration_per_line = 2.0  # 秒
-        
-        for i, chapter in enumerate(chapters):
-            line_no = chapter.get('line_number', 0)
-            
-            # 開始時間
-            start_time = line_no * estimated_duration_per_line
-            
-            # 終了時間（次のチャプターの開始時間、または文書の終わり）
-            if i + 1 < len(chapters):
-                next_line = chapters[i + 1].get('line_number', total_lines)
-            else:
-                next_line = total_lines
-            
-            end_time = next_line * estimated_duration_per_line
-            
-            chapter['start_time'] = start_time
-            chapter['end_time'] = end_time
-            chapter['duration'] = end_time - start_time
+    def _set_timestamps(self, chapter: Dict, end_line: int) -> None:
+        """開始行から次のトップレベル要素の開始行（または文書の終わり）までの推定時間を設定"""
+        start_time = chapter['line_number'] * _SECONDS_PER_LINE
+        end_time = end_line * _SECONDS_PER_LINE
         
-        return chapters
\ No newline at end of file
+        chapter['start_time'] = start_time
+        chapter['end_time'] = end_time
+        chapter['duration'] = end_time - start_time
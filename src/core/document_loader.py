@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from ..config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# job_id -> (有効期限, 文書データ)。スライド生成と音声生成で同じ文書を二重に取得しないよう共有する
+_cache: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+
+# 取得中のjob_id。同時に要求されても取得は1回にまとめる
+_pending: Dict[str, "asyncio.Future[Dict]"] = {}
+
+async def get_document(job_id: str) -> Dict:
+    """
+    ジョブの文書データを取得（一定時間メモ化）
+    
+    返す辞書はキャッシュと共有されるため、呼び出し側で変更しないこと
+    
+    Args:
+        job_id: ジョブID
+    
+    Returns:
+        文書データ
+    """
+    entry = _cache.get(job_id)
+    if entry is not None and entry[0] > time.monotonic():
+        _cache.move_to_end(job_id)
+        return entry[1]
+    
+    pending = _pending.get(job_id)
+    if pending is not None:
+        return await pending
+    
+    future = asyncio.ensure_future(_load_document(job_id))
+    _pending[job_id] = future
+    try:
+        document = await future
+    finally:
+        _pending.pop(job_id, None)
+    
+    _cache[job_id] = (time.monotonic() + settings.document_cache_ttl, document)
+    _cache.move_to_end(job_id)
+    while len(_cache) > settings.document_cache_size:
+        _cache.popitem(last=False)
+    
+    return document
+
+async def _load_document(job_id: str) -> Dict:
+    """文書データを取得（ダミーデータ）"""
+    # 実際の実装ではデータベースから取得
+    return {
+        'title': '数学解析の基礎',
+        'author': '著者名',
+        'chapters': [
+            {
+                'title': '微分積分学の基礎',
+                'type': 'chapter',
+                'content': '微分積分学は、変化率と累積を扱う数学の分野です。導関数は関数の変化率を表し、積分は累積量を計算します。',
+                'math_expressions': [r'f\'(x) = \lim_{h \to 0} \frac{f(x+h) - f(x)}{h}']
+            },
+            {
+                'title': '線形代数の基礎',
+                'type': 'chapter',
+                'content': 'ベクトル、行列、連立方程式',
+                'math_expressions': [r'A\mathbf{x} = \mathbf{b}']
+            }
+        ]
+    }
@@ -1,15 +1,108 @@
 import asyncio
 import logging
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
-import PyPDF2
 import pdfplumber
 from pylatex import Document as LatexDocument
 from pylatex.utils import NoEscape
 import re
 
+# 線形時間のDFAエンジン（インストールされていれば利用者のテキスト走査に使う）
+try:
+    import re2
+    RE2_AVAILABLE = True
+except ImportError:
+    RE2_AVAILABLE = False
+
+from ..utils.process_pool import discard_process_pool, get_process_pool, process_pool_size
+
 logger = logging.getLogger(__name__)
 
+# RE2の\s・\dはASCIIのみなので、Pythonのreと同じUnicodeの範囲に置き換える
+_RE2_CLASSES = {
+    r'[^\S\n]': r'[\t\x0b\x0c\r\x1c-\x1f\x85\p{Z}]',
+    r'\s': r'[\t\n\x0b\x0c\r\x1c-\x1f\x85\p{Z}]',
+    r'\d': r'\p{Nd}',
+}
+# エスケープされたバックスラッシュ（\\section等）を先に消費して誤置換を防ぐ
+_RE2_CLASS_RE = re.compile(r'\\\\|\[\^\\S\\n\]|\\[sd]')
+_RE2_FLAGS = ((re.IGNORECASE, 'i'), (re.MULTILINE, 'm'), (re.DOTALL, 's'))
+
+def _compile(pattern: str, flags: int = 0):
+    """利用者のテキストを走査するパターンをコンパイル（re2があれば線形時間で照合する）"""
+    if not RE2_AVAILABLE:
+        return re.compile(pattern, flags)
+    
+    inline_flags = ''.join(flag for mask, flag in _RE2_FLAGS if flags & mask)
+    translated = _RE2_CLASS_RE.sub(
+        lambda m: _RE2_CLASSES.get(m.group(), m.group()), pattern
+    )
+    return re2.compile(f'(?{inline_flags}){translated}' if inline_flags else translated)
+
+# 章見出しパターン（行頭・行末の空白は無視する）
+# 複数行モードの1つの正規表現で全文を1回だけ走査する
+_CHAPTER_PATTERN = (
+    r'^[^\S\n]*(?:'
+    r'第[^\S\n]*\d+[^\S\n]*章[^\S\n]+(?P<ja>.+)'  # 第1章 タイトル
+    r'|Chapter[^\S\n]+\d+[.:]\ *(?P<en>.+)'  # Chapter 1: Title
+    r'|\d+\.[^\S\n]+(?P<num>.+)'  # 1. タイトル
+    r'|#{1,3}[^\S\n]+(?P<md>.+)'  # Markdown headers
+    r'|(?P<upper>[A-Z](?:[A-Z]|[^\S\n])*[A-Z])[^\S\n]*$'  # 全大文字のタイトル
+    r')'
+)
+_CHAPTER_RE = _compile(_CHAPTER_PATTERN, re.MULTILINE | re.IGNORECASE)
+
+# 数式パターン（LaTeX形式）
+_MATH_PATTERN = (
+    r'\$\$(?P<display>[^$]+)\$\$'  # Display math
+    r'|\$(?P<inline>[^$]+)\$'  # Inline math
+    r'|\\begin\{equation\}(?P<equation>(?s:.*?))\\end\{equation\}'  # equation環境
+    r'|\\begin\{align\}(?P<align>(?s:.*?))\\end\{align\}'  # align環境
+)
+
+# 数式を位置順に1回の走査で抽出するパターン
+_MATH_RE = _compile(_MATH_PATTERN)
+
+# LaTeX文書用の数式パターン（eqnarray環境を含む）
+_LATEX_MATH_RE = _compile(
+    r'\\begin\{equation\}(?P<equation>(?s:.*?))\\end\{equation\}'
+    r'|\\begin\{align\}(?P<align>(?s:.*?))\\end\{align\}'
+    r'|\\begin\{eqnarray\}(?P<eqnarray>(?s:.*?))\\end\{eqnarray\}'
+    r'|\$\$(?P<display>[^$]+)\$\$'
+    r'|\$(?P<inline>[^$]+)\$'
+)
+
+# LaTeXのセクション系コマンドのパターン
+_SECTION_PATTERNS = [
+    (_compile(r'\\chapter\{([^}]+)\}'), 'chapter'),
+    (_compile(r'\\section\{([^}]+)\}'), 'section'),
+    (_compile(r'\\subsection\{([^}]+)\}'), 'subsection'),
+    (_compile(r'\\subsubsection\{([^}]+)\}'), 'subsubsection')
+]
+
+@lru_cache(maxsize=None)
+def _latex_command_re(command: str):
+    """\\command{...} の内容を取り出すパターン（コマンド名ごとに一度だけコンパイル）"""
+    return _compile(rf'\\{command}\{{([^}}]+)\}}')
+
+@lru_cache(maxsize=None)
+def _latex_environment_re(env: str):
+    """\\begin{env}...\\end{env} の内容を取り出すパターン（環境名ごとに一度だけコンパイル）"""
+    return _compile(rf'\\begin\{{{env}\}}(.*?)\\end\{{{env}\}}', re.DOTALL)
+
+# Markdownの最初のH1
+_MARKDOWN_TITLE_RE = _compile(r'^#\s+(.+)$', re.MULTILINE)
+
+# これ以上のページ数のPDFはプロセスプールでテキスト抽出を並列化する
+_PARALLEL_PAGE_THRESHOLD = 16
+
+def _extract_pages_text(file_path: str, page_numbers: List[int]) -> List[str]:
+    """指定ページ（1始まり）のテキストを抽出（プロセスプールのワーカーからも呼ばれる）"""
+    with pdfplumber.open(file_path, pages=page_numbers) as pdf:
+        return [page.extract_text() or '' for page in pdf.pages]
+
 class DocumentParser:
     """数学文書（PDF、LaTeX）の解析クラス"""
     
@@ -50,30 +143,22 @@ class DocumentParser:
         }
         
         try:
-            # PyPDF2でメタデータ取得
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                result['total_pages'] = len(pdf_reader.pages)
-                
-                if pdf_reader.metadata:
-                    result['title'] = pdf_reader.metadata.get('/Title', '')
-                    result['author'] = pdf_reader.metadata.get('/Author', '')
+            total_pages, metadata, page_texts = await asyncio.to_thread(self._read_pdf, file_path)
+            result['total_pages'] = total_pages
             
-            # pdfplumberで詳細テキスト抽出
-            with pdfplumber.open(file_path) as pdf:
-                full_text = ""
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        full_text += page_text + "\n"
-                
-                result['text_content'] = full_text
-                
-                # 章構造の検出
-                result['chapters'] = self._detect_chapters(full_text)
-                
-                # 数式の検出（LaTeX形式）
-                result['math_expressions'] = self._extract_math_expressions(full_text)
+            if metadata:
+                result['title'] = metadata.get('Title', '')
+                result['author'] = metadata.get('Author', '')
+            
+            # 大きなPDFはページ範囲ごとにワーカープロセスで抽出
+            if page_texts is None:
+                page_texts = await self._extract_pdf_text_parallel(file_path, total_pages)
+            
+            full_text = "".join(text + "\n" for text in page_texts if text)
+            result['text_content'] = full_text
+            
+            # 章構造と数式（LaTeX形式）を検出
+            result['chapters'], result['math_expressions'] = self._scan_text(full_text)
                 
         except Exception as e:
             logger.error(f"PDF parsing error: {e}")
@@ -81,6 +166,43 @@ class DocumentParser:
         
         return result
     
+    def _read_pdf(self, file_path: Path) -> Tuple[int, Dict, Optional[List[str]]]:
+        """PDFを1回だけ開き、ページ数・メタデータ・（小さいPDFなら）ページテキストを取得"""
+        with pdfplumber.open(file_path) as pdf:
+            total_pages = len(pdf.pages)
+            metadata = pdf.metadata
+            
+            if total_pages >= _PARALLEL_PAGE_THRESHOLD and process_pool_size() > 1:
+                return total_pages, metadata, None
+            
+            page_texts = [page.extract_text() or '' for page in pdf.pages]
+        
+        return total_pages, metadata, page_texts
+    
+    async def _extract_pdf_text_parallel(self, file_path: Path, total_pages: int) -> List[str]:
+        """ページ範囲ごとにプロセスプールでテキストを抽出し、ページ順に結合"""
+        page_numbers = list(range(1, total_pages + 1))
+        chunk_size = -(-total_pages // process_pool_size())
+        chunks = [
+            page_numbers[i:i + chunk_size]
+            for i in range(0, total_pages, chunk_size)
+        ]
+        
+        # pdfplumberのPageはpickleできないため、各ワーカーがファイルを開き直す
+        # プールはアップロードごとに作らず、プロセス数を設定で抑えた共有プールを使う
+        loop = asyncio.get_running_loop()
+        executor = get_process_pool()
+        try:
+            results = await asyncio.gather(*[
+                loop.run_in_executor(executor, _extract_pages_text, str(file_path), chunk)
+                for chunk in chunks
+            ])
+        except BrokenProcessPool:
+            discard_process_pool(executor)
+            raise
+        
+        return [text for chunk_texts in results for text in chunk_texts]
+    
     async def _parse_latex(self, file_path: Path) -> Dict:
         """LaTeX文書の解析"""
         result = {
@@ -94,8 +216,7 @@ class DocumentParser:
         }
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
+            content = await asyncio.to_thread(file_path.read_text, encoding='utf-8')
             
             result['text_content'] = content
             
@@ -129,15 +250,13 @@ class DocumentParser:
         }
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
+            content = await asyncio.to_thread(file_path.read_text, encoding='utf-8')
             
             result['text_content'] = content
-            result['chapters'] = self._detect_chapters(content)
-            result['math_expressions'] = self._extract_math_expressions(content)
+            result['chapters'], result['math_expressions'] = self._scan_text(content)
             
             # Markdownの場合、最初のH1をタイトルとして扱う
-            title_match = re.search(r'^#\s+(.+)$', content, re.MULTILINE)
+            title_match = _MARKDOWN_TITLE_RE.search(content)
             if title_match:
                 result['title'] = title_match.group(1)
                 
@@ -150,74 +269,53 @@ class DocumentParser:
     def _detect_chapters(self, text: str) -> List[Dict]:
         """テキストから章構造を検出"""
         chapters = []
-        lines = text.split('\n')
-        
-        chapter_patterns = [
-            r'^第\s*\d+\s*章\s+(.+)',  # 第1章 タイトル
-            r'^Chapter\s+\d+[\.:]\ *(.+)',  # Chapter 1: Title
-            r'^\d+\.\s+(.+)',  # 1. タイトル
-            r'^#{1,3}\s+(.+)$',  # Markdown headers
-            r'^[A-Z][A-Z\s]+$'  # 全大文字のタイトル
-        ]
+        line_number = 0
+        last_pos = 0
         
-        for i, line in enumerate(lines):
-            line = line.strip()
-            for pattern in chapter_patterns:
-                match = re.match(pattern, line, re.IGNORECASE)
-                if match:
-                    chapters.append({
-                        'title': match.group(1) if match.groups() else line,
-                        'line_number': i,
-                        'type': 'chapter'
-                    })
-                    break
+        for match in _CHAPTER_RE.finditer(text):
+            # 行番号は直前のマッチ位置からの改行数で求める
+            line_number += text.count('\n', last_pos, match.start())
+            last_pos = match.start()
+            
+            title = match.group(match.lastgroup)
+            chapters.append({
+                'title': title.rstrip(),
+                'line_number': line_number,
+                'type': 'chapter'
+            })
         
         return chapters
     
+    def _scan_text(self, text: str) -> Tuple[List[Dict], List[str]]:
+        """
+        章構造と数式を検出
+        
+        章見出しと数式は別々に走査する（1つの正規表現にまとめると、見出し行の中の数式や、
+        行をまたぐ$...$の中の見出しが、もう一方のマッチに飲み込まれて失われる）
+        """
+        return self._detect_chapters(text), self._extract_math_expressions(text)
+    
     def _extract_math_expressions(self, text: str) -> List[str]:
         """数式を抽出"""
-        # LaTeX形式の数式パターン
-        patterns = [
-            r'\$\$([^$]+)\$\$',  # Display math
-            r'\$([^$]+)\$',      # Inline math
-            r'\\begin\{equation\}(.*?)\\end\{equation\}',  # equation環境
-            r'\\begin\{align\}(.*?)\\end\{align\}'  # align環境
-        ]
-        
-        math_expressions = []
-        for pattern in patterns:
-            matches = re.findall(pattern, text, re.DOTALL)
-            math_expressions.extend(matches)
-        
-        return math_expressions
+        # 名前付きグループ(lastgroup)がマッチした数式の本体
+        return [match.group(match.lastgroup) for match in _MATH_RE.finditer(text)]
     
     def _extract_latex_command(self, content: str, command: str) -> str:
         """LaTeXコマンドの内容を抽出"""
-        pattern = rf'\\{command}\{{([^}}]+)\}}'
-        match = re.search(pattern, content)
+        match = _latex_command_re(command).search(content)
         return match.group(1) if match else ''
     
     def _extract_latex_environment(self, content: str, env: str) -> str:
         """LaTeX環境の内容を抽出"""
-        pattern = rf'\\begin\{{{env}\}}(.*?)\\end\{{{env}\}}'
-        match = re.search(pattern, content, re.DOTALL)
+        match = _latex_environment_re(env).search(content)
         return match.group(1).strip() if match else ''
     
     def _extract_latex_structure(self, content: str) -> List[Dict]:
         """LaTeX文書の構造を抽出"""
         chapters = []
         
-        # セクション系コマンドのパターン
-        section_patterns = [
-            (r'\\chapter\{([^}]+)\}', 'chapter'),
-            (r'\\section\{([^}]+)\}', 'section'),
-            (r'\\subsection\{([^}]+)\}', 'subsection'),
-            (r'\\subsubsection\{([^}]+)\}', 'subsubsection')
-        ]
-        
-        for pattern, section_type in section_patterns:
-            matches = re.finditer(pattern, content)
-            for match in matches:
+        for pattern, section_type in _SECTION_PATTERNS:
+            for match in pattern.finditer(content):
                 chapters.append({
                     'title': match.group(1),
                     'type': section_type,
@@ -231,17 +329,4 @@ class DocumentParser:
     
     def _extract_latex_math(self, content: str) -> List[str]:
         """LaTeX数式を抽出"""
-        math_patterns = [
-            r'\\begin\{equation\}(.*?)\\end\{equation\}',
-            r'\\begin\{align\}(.*?)\\end\{align\}',
-            r'\\begin\{eqnarray\}(.*?)\\end\{eqnarray\}',
-            r'\$\$([^$]+)\$\$',
-            r'\$([^$]+)\$'
-        ]
-        
-        math_expressions = []
-        for pattern in math_patterns:
-            matches = re.findall(pattern, content, re.DOTALL)
-            math_expressions.extend(matches)
-        
-        return math_expressions
\ No newline at end of file
+        return [match.group(match.lastgroup) for match in _LATEX_MATH_RE.finditer(content)]
\ No newline at end of file
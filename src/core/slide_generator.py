@@ -1,16 +1,107 @@
 import asyncio
+import hashlib
+import json
 import logging
+import os
+import shutil
+import tempfile
+import uuid
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from pylatex import Document, Command, Section, Subsection, Math, NoEscape
 from pylatex.base_classes import Environment
 from pylatex.package import Package
 import subprocess
 
 from ..config.settings import settings
+from ..utils.file_manager import link_or_copy, scratch_root
+from .document_loader import get_document
 
 logger = logging.getLogger(__name__)
 
+# 同じ内容のスライドPDFを再利用するキャッシュの置き場所
+_PDF_CACHE_DIRNAME = "slide_cache"
+
+# プリアンブルを事前にダンプしたフォーマット(.fmt)の置き場所（temp_dir配下）
+_FORMAT_DIRNAME = "latex_formats"
+
+# .auxが安定するまでに実行するpdflatex本番パスの上限
+_MAX_LATEX_PASSES = 3
+
+# ジョブごとの前回の補助ファイルの置き場所（スライドキャッシュ配下）。作業領域は毎回作り直すので、ここから持ち越す
+_AUX_DIRNAME = "aux"
+
+# 次のパスが読み込む補助ファイル（目次・beamerのナビゲーション・しおり）。.auxだけでは目次が空になるので、まとめて扱う
+_AUX_SUFFIXES = ('.aux', '.toc', '.nav', '.snm', '.out')
+
+# テンプレートごとのプリアンブル定義（パッケージ名, テーマ設定コマンド）
+_TEMPLATE_PREAMBLES = {
+    'academic': (
+        ('amsmath', 'amssymb', 'amsfonts', 'mathtools', 'graphicx', 'xcolor', 'tikz'),
+        (('usetheme', 'Madrid'), ('usecolortheme', 'default')),
+    ),
+    'modern': (
+        ('amsmath', 'mathtools', 'tikz', 'tcolorbox'),
+        (('usetheme', 'metropolis'),),
+    ),
+}
+
+@lru_cache(maxsize=None)
+def _build_preamble(template: str) -> Tuple[Tuple[Package, ...], Tuple[Command, ...]]:
+    """テンプレートのパッケージとテーマ設定を一度だけ組み立てる（描画時に読まれるだけなので共有する）"""
+    package_names, theme_commands = _TEMPLATE_PREAMBLES[template]
+    packages = tuple(Package(name) for name in package_names)
+    theme = tuple(Command(command, argument) for command, argument in theme_commands)
+    return packages, theme
+
+def _pdf_cache_key(template: str, document_data: Dict) -> str:
+    """テンプレート名と文書データ（正規化したJSON）からキャッシュキーを求める"""
+    canonical = json.dumps(document_data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{template}\0{canonical}".encode('utf-8')).hexdigest()
+
+def _aux_digest(tex_path: Path) -> Optional[bytes]:
+    """補助ファイル一式のダイジェスト（.auxが無ければNone）"""
+    if not tex_path.with_suffix('.aux').exists():
+        return None
+    digest = hashlib.blake2b()
+    for suffix in _AUX_SUFFIXES:
+        file_digest = _file_digest(tex_path.with_suffix(suffix))
+        digest.update(suffix.encode() + (file_digest or b''))
+    return digest.digest()
+
+def _file_digest(path: Path) -> Optional[bytes]:
+    """ファイル内容のダイジェスト（存在しなければNone）"""
+    try:
+        return hashlib.blake2b(path.read_bytes()).digest()
+    except FileNotFoundError:
+        return None
+
+def _restore_aux_files(aux_cache: Path, tex_path: Path) -> None:
+    """保存しておいた補助ファイル一式を作業領域に戻す（一式に.auxが無ければ何もしない）"""
+    if not (aux_cache / f"{tex_path.stem}.aux").exists():
+        return
+    for suffix in _AUX_SUFFIXES:
+        try:
+            shutil.copyfile(aux_cache / f"{tex_path.stem}{suffix}", tex_path.with_suffix(suffix))
+        except FileNotFoundError:
+            pass
+
+def _save_aux_files(tex_path: Path, aux_cache: Path) -> None:
+    """作業領域の補助ファイル一式を保存（今回作られなかったものは前回の分も消す）"""
+    aux_cache.mkdir(parents=True, exist_ok=True)
+    # 古い.auxを先に消して最後に置き換え、.auxがあれば一式がそろっているようにする
+    (aux_cache / f"{tex_path.stem}.aux").unlink(missing_ok=True)
+    for suffix in sorted(_AUX_SUFFIXES, key=lambda suffix: suffix == '.aux'):
+        source = tex_path.with_suffix(suffix)
+        target = aux_cache / source.name
+        if not source.exists():
+            target.unlink(missing_ok=True)
+            continue
+        temp_path = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+        shutil.copyfile(source, temp_path)
+        os.replace(temp_path, target)
+
 class SlideGenerator:
     """スライド生成クラス（Beamer使用）"""
     
@@ -36,26 +127,51 @@ class SlideGenerator:
             # 文書データを取得（実際の実装ではデータベースから）
             document_data = await self._get_document_data(job_id)
             
+            # ファイル名とパスを設定
+            tex_filename = f"{job_id}_slides"
+            pdf_path = Path(settings.output_dir) / f"{tex_filename}.pdf"
+            
+            # 同じテンプレート・同じ内容なら以前のPDFを再利用し、pdflatexを起動しない
+            cache_path = (
+                Path(settings.output_dir) / _PDF_CACHE_DIRNAME
+                / f"{_pdf_cache_key(template, document_data)}.pdf"
+            )
+            if cache_path.exists():
+                pdf_path.parent.mkdir(parents=True, exist_ok=True)
+                await asyncio.to_thread(link_or_copy, cache_path, pdf_path)
+                logger.info(f"Slides reused from cache: {pdf_path}")
+                return str(pdf_path)
+            
             # テンプレート関数を取得
             template_func = self.templates.get(template, self.templates['default'])
             
             # LaTeX文書を作成
             doc = template_func(document_data)
             
-            # ファイル名とパスを設定
-            tex_filename = f"{job_id}_slides"
-            tex_path = Path(settings.temp_dir) / f"{tex_filename}.tex"
-            pdf_path = Path(settings.output_dir) / f"{tex_filename}.pdf"
-            
             # ディレクトリ作成
-            tex_path.parent.mkdir(parents=True, exist_ok=True)
             pdf_path.parent.mkdir(parents=True, exist_ok=True)
             
-            # LaTeXファイルを生成
-            doc.generate_tex(str(tex_path.with_suffix('')))
+            # .aux/.log/.nav等の中間ファイルはジョブ専用の作業領域（可能ならtmpfs）に出し、終わったら丸ごと消す
+            work_root = scratch_root(settings.scratch_dir, Path(settings.temp_dir))
+            with tempfile.TemporaryDirectory(dir=work_root, prefix=f"{job_id}_") as work_dir:
+                tex_path = Path(work_dir) / f"{tex_filename}.tex"
+                
+                # LaTeXファイルを生成
+                # プリアンブルはダンプ済みフォーマットから読み込み、毎回のパッケージ読み込みを省く
+                source = doc.dumps()
+                preamble, begin, body = source.partition('\\begin{document}')
+                format_name = await self._ensure_format(preamble) if begin else None
+                if format_name:
+                    source = begin + body
+                await asyncio.to_thread(tex_path.write_text, source, encoding='utf-8')
+                
+                # PDFにコンパイル
+                aux_cache = cache_path.parent / _AUX_DIRNAME / tex_filename
+                await self._compile_latex(tex_path, pdf_path, format_name, aux_cache)
             
-            # PDFにコンパイル
-            await self._compile_latex(tex_path, pdf_path)
+            # 次回以降のためにキャッシュへ登録
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            await asyncio.to_thread(link_or_copy, pdf_path, cache_path)
             
             logger.info(f"Slides generated successfully: {pdf_path}")
             return str(pdf_path)
@@ -65,26 +181,8 @@ class SlideGenerator:
             raise
     
     async def _get_document_data(self, job_id: str) -> Dict:
-        """文書データを取得（ダミーデータ）"""
-        # 実際の実装ではデータベースから取得
-        return {
-            'title': '数学解析の基礎',
-            'author': '著者名',
-            'chapters': [
-                {
-                    'title': '微分積分学の基礎',
-                    'type': 'chapter',
-                    'content': '微分積分学の導入と基本概念',
-                    'math_expressions': [r'f\'(x) = \lim_{h \to 0} \frac{f(x+h) - f(x)}{h}']
-                },
-                {
-                    'title': '線形代数の基礎',
-                    'type': 'chapter', 
-                    'content': 'ベクトル、行列、連立方程式',
-                    'math_expressions': [r'A\mathbf{x} = \mathbf{b}']
-                }
-            ]
-        }
+        """文書データを取得（音声生成と共有するメモ化ローダー経由）"""
+        return await get_document(job_id)
     
     def _academic_template(self, document_data: Dict) -> Document:
         """アカデミックテンプレート"""
@@ -97,18 +195,11 @@ class SlideGenerator:
             lmodern=False
         )
         
-        # パッケージの追加
-        doc.packages.append(Package('amsmath'))
-        doc.packages.append(Package('amssymb'))
-        doc.packages.append(Package('amsfonts'))
-        doc.packages.append(Package('mathtools'))
-        doc.packages.append(Package('graphicx'))
-        doc.packages.append(Package('xcolor'))
-        doc.packages.append(Package('tikz'))
-        
-        # テーマの設定
-        doc.append(Command('usetheme', 'Madrid'))
-        doc.append(Command('usecolortheme', 'default'))
+        # パッケージとテーマの設定（キャッシュ済みのものを使う）
+        packages, theme = _build_preamble('academic')
+        for package in packages:
+            doc.packages.append(package)
+        doc.extend(theme)
         
         # タイトル情報
         doc.append(Command('title', document_data.get('title', '')))
@@ -139,12 +230,10 @@ class SlideGenerator:
         )
         
         # モダンなパッケージとテーマ
-        doc.packages.append(Package('amsmath'))
-        doc.packages.append(Package('mathtools'))
-        doc.packages.append(Package('tikz'))
-        doc.packages.append(Package('tcolorbox'))
-        
-        doc.append(Command('usetheme', 'metropolis'))
+        packages, theme = _build_preamble('modern')
+        for package in packages:
+            doc.packages.append(package)
+        doc.extend(theme)
         
         # 同様の構造で実装
         return self._academic_template(document_data)
@@ -168,36 +257,105 @@ class SlideGenerator:
                 with doc.create(Math()) as math:
                     math.append(NoEscape(math_expr))
     
-    async def _compile_latex(self, tex_path: Path, pdf_path: Path):
-        """LaTeXをPDFにコンパイル"""
+    async def _ensure_format(self, preamble: str) -> Optional[str]:
+        """プリアンブルをダンプしたフォーマットを用意してその名前を返す（作成できなければNone）"""
+        format_dir = Path(settings.temp_dir) / _FORMAT_DIRNAME
+        digest = hashlib.blake2b(preamble.encode('utf-8'), digest_size=8).hexdigest()
+        format_name = f"preamble_{digest}"
+        format_path = format_dir / f"{format_name}.fmt"
+        if format_path.exists():
+            return format_name
+        
+        # 並行するジョブと衝突しないよう一時的なジョブ名でダンプしてから置き換える
+        build_name = f"{format_name}_{uuid.uuid4().hex}"
+        source_path = format_dir / f"{build_name}.tex"
+        format_dir.mkdir(parents=True, exist_ok=True)
+        source_path.write_text(preamble + '\n\\dump\n', encoding='utf-8')
+        
         try:
-            # pdflatexコマンドを実行
-            process = await asyncio.create_subprocess_exec(
-                settings.pdflatex_path,
-                '-interaction=nonstopmode',
-                '-output-directory=' + str(tex_path.parent),
-                str(tex_path),
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
+            # mylatex方式: 初期化モードでpdflatexフォーマットを読み込み、プリアンブル直後でダンプ
+            await self._run_pdflatex(source_path, '-ini', f'-jobname={build_name}', '&pdflatex')
+            os.replace(format_dir / f"{build_name}.fmt", format_path)
+        except Exception as e:
+            logger.warning(f"Failed to dump LaTeX format, compiling without it: {e}")
+            return None
+        finally:
+            for suffix in ('.tex', '.log', '.fmt'):
+                (format_dir / f"{build_name}{suffix}").unlink(missing_ok=True)
+        
+        return format_name
+    
+    async def _compile_latex(self, tex_path: Path, pdf_path: Path, format_name: Optional[str] = None,
+                             aux_cache: Optional[Path] = None):
+        """
+        LaTeXをPDFにコンパイル
+        
+        aux_cache（ディレクトリ）を渡すと、前回のビルドの補助ファイル一式（.aux/.toc/.nav等）から始め、
+        ビルド後の一式をそこに保存する（同じジョブの再ビルドで変わらなければ、pdflatexは1パスで済む）
+        """
+        options = (f'-fmt={format_name}',) if format_name else ()
+        try:
+            if aux_cache is not None and not tex_path.with_suffix('.aux').exists():
+                _restore_aux_files(aux_cache, tex_path)
+            previous_aux = _aux_digest(tex_path)
             
-            stdout, stderr = await asyncio.wait_for(
-                process.communicate(), 
-                timeout=settings.latex_timeout
-            )
+            # 補助ファイルがまだ無ければ、PDFを書き出さないdraftmodeで目次等の参照を先に確定させる
+            if previous_aux is None:
+                await self._run_pdflatex(tex_path, *options, '-draftmode')
+                previous_aux = _aux_digest(tex_path)
+            
+            # 本番パスは補助ファイルが変化しなくなった時点で打ち切る
+            for _ in range(_MAX_LATEX_PASSES):
+                await self._run_pdflatex(tex_path, *options)
+                current_aux = _aux_digest(tex_path)
+                if current_aux == previous_aux:
+                    break
+                previous_aux = current_aux
             
-            if process.returncode != 0:
-                error_msg = stderr.decode('utf-8') if stderr else 'Unknown LaTeX error'
-                raise RuntimeError(f"LaTeX compilation failed: {error_msg}")
+            if aux_cache is not None and previous_aux is not None:
+                _save_aux_files(tex_path, aux_cache)
             
-            # 生成されたPDFを出力ディレクトリに移動
+            # 生成されたPDFを出力ディレクトリに移動（作業領域は別ファイルシステムのことがある）。
+            # pdf_pathはキャッシュとハードリンクしていることがあるので、中身を書き換えず一時ファイルから置き換える
             generated_pdf = tex_path.with_suffix('.pdf')
             if generated_pdf.exists():
-                generated_pdf.rename(pdf_path)
+                temp_pdf = pdf_path.with_name(f".{pdf_path.name}.{uuid.uuid4().hex}.tmp")
+                try:
+                    shutil.move(generated_pdf, temp_pdf)
+                    os.replace(temp_pdf, pdf_path)
+                except BaseException:
+                    temp_pdf.unlink(missing_ok=True)
+                    raise
             else:
                 raise FileNotFoundError("PDF was not generated")
                 
         except asyncio.TimeoutError:
             raise RuntimeError(f"LaTeX compilation timed out after {settings.latex_timeout} seconds")
         except Exception as e:
-            raise RuntimeError(f"LaTeX compilation error: {str(e)}")
\ No newline at end of file
+            raise RuntimeError(f"LaTeX compilation error: {str(e)}")
+    
+    async def _run_pdflatex(self, tex_path: Path, *options: str):
+        """pdflatexを1パス実行"""
+        # ダンプしたフォーマットをkpathseaが見つけられるようにする（末尾の区切りで既定の検索パスも残す）
+        env = dict(os.environ)
+        env['TEXFORMATS'] = str(Path(settings.temp_dir).resolve() / _FORMAT_DIRNAME) + os.pathsep
+        
+        process = await asyncio.create_subprocess_exec(
+            settings.pdflatex_path,
+            '-interaction=nonstopmode',
+            '-output-directory=' + str(tex_path.parent),
+            *options,
+            str(tex_path),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=env
+        )
+        
+        stdout, stderr = await asyncio.wait_for(
+            process.communicate(), 
+            timeout=settings.latex_timeout
+        )
+        
+        if process.returncode != 0:
+            error_msg = stderr.decode('utf-8') if stderr else 'Unknown LaTeX error'
+            raise RuntimeError(f"LaTeX compilation failed: {error_msg}")
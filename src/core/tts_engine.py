@@ -1,27 +1,73 @@
 import asyncio
+import hashlib
+import importlib.util
 import logging
+import queue
+import re
 from pathlib import Path
 from typing import Dict, List, Optional
 import tempfile
 from abc import ABC, abstractmethod
+from functools import lru_cache
 
-# TTS provider imports (these would be installed as needed)
-try:
-    import azure.cognitiveservices.speech as speechsdk
-    AZURE_AVAILABLE = True
-except ImportError:
-    AZURE_AVAILABLE = False
+def _module_available(name: str) -> bool:
+    """モジュールをインポートせずに、インストールされているかだけを確認"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ImportError:
+        # 親パッケージ自体が無い場合
+        return False
 
+# TTS provider SDKs (these would be installed as needed)
+# SDKの読み込みは重いので、有無だけ確認して実際のインポートはプロバイダーの初期化時まで遅らせる
+AZURE_AVAILABLE = _module_available("azure.cognitiveservices.speech")
+GOOGLE_AVAILABLE = _module_available("google.cloud.texttospeech")
+
+# 数式読み上げルールの多パターン置換（C実装のAho-Corasickオートマトン）
 try:
-    from google.cloud import texttospeech
-    GOOGLE_AVAILABLE = True
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
 except ImportError:
-    GOOGLE_AVAILABLE = False
+    AHOCORASICK_AVAILABLE = False
 
 from ..config.settings import settings
+from ..utils.file_manager import link_or_copy
+from .document_loader import get_document
 
 logger = logging.getLogger(__name__)
 
+# 数式の読み上げ変換ルール（簡単なもの。実際にはもっと複雑な処理が必要）
+_MATH_SPEECH_MAP = {
+    r'\frac{': '分数 ',
+    r'}{': ' 分の ',
+    r'}': '',
+    r'\lim_{': 'リミット ',
+    r'\to': 'が近づくとき',
+    r'\sum': '総和',
+    r'\int': '積分',
+    r'\sqrt{': 'ルート ',
+    r'^{': 'の',
+    r'_{': 'サブ',
+    r'\alpha': 'アルファ',
+    r'\beta': 'ベータ',
+    r'\gamma': 'ガンマ'
+}
+
+# 長いルールを先に並べ、'}{' が '}' より、'\lim_{' が '_{' より優先されるようにする
+_MATH_SPEECH_RE = re.compile(
+    '|'.join(re.escape(key) for key in sorted(_MATH_SPEECH_MAP, key=len, reverse=True))
+)
+
+def _build_math_speech_automaton():
+    """読み上げルールからオートマトンを構築（ルール数によらず入力長に線形で照合できる）"""
+    automaton = ahocorasick.Automaton()
+    for key, replacement in _MATH_SPEECH_MAP.items():
+        automaton.add_word(key, (len(key), replacement))
+    automaton.make_automaton()
+    return automaton
+
+_MATH_SPEECH_AUTOMATON = _build_math_speech_automaton() if AHOCORASICK_AVAILABLE else None
+
 class TTSProvider(ABC):
     """TTS プロバイダーの抽象基底クラス"""
     
@@ -38,28 +84,47 @@ class AzureTTSProvider(TTSProvider):
         if not settings.azure_speech_key or not settings.azure_speech_region:
             raise ValueError("Azure Speech credentials not configured")
         
-        self.speech_config = speechsdk.SpeechConfig(
-            subscription=settings.azure_speech_key,
-            region=settings.azure_speech_region
-        )
+        import azure.cognitiveservices.speech as speechsdk
+        self.speechsdk = speechsdk
+        
+        # 音声ごとの接続済みSynthesizerのプール
+        # Synthesizerはスレッドセーフではないので、1つを同時に使うのは1スレッドだけにする
+        self._synthesizers: Dict[str, queue.SimpleQueue] = {}
     
-    async def synthesize_text(self, text: str, output_path: Path, voice: str = "ja-JP-NanamiNeural") -> None:
-        """テキストを音声に変換"""
+    def _acquire_synthesizer(self, voice: str):
+        """プールからSynthesizerを借りる（空なら新しく作る）"""
+        speechsdk = self.speechsdk
         try:
-            self.speech_config.speech_synthesis_voice_name = voice
-            
-            audio_config = speechsdk.audio.AudioOutputConfig(filename=str(output_path))
-            synthesizer = speechsdk.SpeechSynthesizer(
-                speech_config=self.speech_config,
-                audio_config=audio_config
+            return self._synthesizers[voice].get_nowait()
+        except queue.Empty:
+            speech_config = speechsdk.SpeechConfig(
+                subscription=settings.azure_speech_key,
+                region=settings.azure_speech_region
             )
+            speech_config.speech_synthesis_voice_name = voice
+            # 出力先は呼び出しごとに違うので、結果はメモリで受け取って保存する
+            return speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+    
+    async def synthesize_text(self, text: str, output_path: Path, voice: str = "ja-JP-NanamiNeural") -> None:
+        """テキストを音声に変換"""
+        speechsdk = self.speechsdk
+        pool = self._synthesizers.setdefault(voice, queue.SimpleQueue())
+        
+        def synthesize():
+            synthesizer = self._acquire_synthesizer(voice)
+            try:
+                result = synthesizer.speak_text_async(text).get()
+            finally:
+                pool.put(synthesizer)
             
+            if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
+                speechsdk.AudioDataStream(result).save_to_wav_file(str(output_path))
+            return result
+        
+        try:
             # 非同期実行のため、スレッドプールで実行
             loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(
-                None, 
-                lambda: synthesizer.speak_text_async(text).get()
-            )
+            result = await loop.run_in_executor(None, synthesize)
             
             if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
                 logger.info(f"Audio synthesized successfully: {output_path}")
@@ -77,10 +142,27 @@ class GoogleTTSProvider(TTSProvider):
         if not GOOGLE_AVAILABLE:
             raise ImportError("Google Cloud TTS SDK not available")
         
-        self.client = texttospeech.TextToSpeechClient()
+        from google.cloud import texttospeech
+        from google.cloud.texttospeech_v1.services.text_to_speech.transports import TextToSpeechGrpcTransport
+        self.texttospeech = texttospeech
+        
+        # 呼び出しの合間もkeepaliveでgRPC接続を維持し、毎回のTLSハンドシェイクを避ける
+        channel = TextToSpeechGrpcTransport.create_channel(
+            options=[
+                ("grpc.keepalive_time_ms", 30000),
+                ("grpc.keepalive_timeout_ms", 10000),
+                ("grpc.keepalive_permit_without_calls", 1),
+                ("grpc.max_send_message_length", -1),
+                ("grpc.max_receive_message_length", -1),
+            ]
+        )
+        self.client = texttospeech.TextToSpeechClient(
+            transport=TextToSpeechGrpcTransport(channel=channel)
+        )
     
     async def synthesize_text(self, text: str, output_path: Path, voice: str = "ja-JP-Wavenet-A") -> None:
         """テキストを音声に変換"""
+        texttospeech = self.texttospeech
         try:
             synthesis_input = texttospeech.SynthesisInput(text=text)
             
@@ -115,31 +197,36 @@ class GoogleTTSProvider(TTSProvider):
             logger.error(f"Google TTS error: {e}")
             raise
 
+@lru_cache(maxsize=1)
+def _shared_providers() -> Dict[str, TTSProvider]:
+    """利用可能なTTSプロバイダーを初期化（プロセスごとに一度だけ）"""
+    providers = {}
+    
+    if AZURE_AVAILABLE and settings.azure_speech_key:
+        try:
+            providers['azure'] = AzureTTSProvider()
+            logger.info("Azure TTS provider initialized")
+        except Exception as e:
+            logger.warning(f"Failed to initialize Azure TTS: {e}")
+    
+    if GOOGLE_AVAILABLE and settings.google_tts_credentials:
+        try:
+            providers['google'] = GoogleTTSProvider()
+            logger.info("Google TTS provider initialized")
+        except Exception as e:
+            logger.warning(f"Failed to initialize Google TTS: {e}")
+    
+    if not providers:
+        logger.warning("No TTS providers available")
+    
+    return providers
+
 class TTSEngine:
     """TTS エンジンメインクラス"""
     
     def __init__(self):
-        self.providers = {}
-        self._initialize_providers()
-    
-    def _initialize_providers(self):
-        """利用可能なTTSプロバイダーを初期化"""
-        if AZURE_AVAILABLE and settings.azure_speech_key:
-            try:
-                self.providers['azure'] = AzureTTSProvider()
-                logger.info("Azure TTS provider initialized")
-            except Exception as e:
-                logger.warning(f"Failed to initialize Azure TTS: {e}")
-        
-        if GOOGLE_AVAILABLE and settings.google_tts_credentials:
-            try:
-                self.providers['google'] = GoogleTTSProvider()
-                logger.info("Google TTS provider initialized")
-            except Exception as e:
-                logger.warning(f"Failed to initialize Google TTS: {e}")
-        
-        if not self.providers:
-            logger.warning("No TTS providers available")
+        # プロバイダー（とその接続）はプロセス内のジョブ間で共有する
+        self.providers = dict(_shared_providers())
     
     async def generate_audio(self, job_id: str, voice: str = "ja-JP-NanamiNeural", language: str = "ja") -> str:
         """
@@ -157,8 +244,8 @@ class TTSEngine:
             # 文書データを取得
             document_data = await self._get_document_data(job_id)
             
-            # テキストを準備
-            full_text = self._prepare_text_for_tts(document_data)
+            # テキストを章ごとのセグメントに分けて準備
+            segments = self._prepare_segments_for_tts(document_data)
             
             # 出力ファイルパス
             audio_path = Path(settings.output_dir) / f"{job_id}_audio.wav"
@@ -166,7 +253,10 @@ class TTSEngine:
             
             # プロバイダーを選択して音声生成
             provider = self._select_provider(voice)
-            await provider.synthesize_text(full_text, audio_path, voice)
+            if len(segments) <= 1:
+                await self._cached_synthesize(provider, "\n".join(segments), audio_path, voice)
+            else:
+                await self._synthesize_segments(provider, segments, audio_path, voice)
             
             logger.info(f"Audio generated successfully: {audio_path}")
             return str(audio_path)
@@ -175,6 +265,72 @@ class TTSEngine:
             logger.error(f"Audio generation error: {e}")
             raise
     
+    async def _synthesize_segments(self, provider: TTSProvider, segments: List[str],
+                                   audio_path: Path, voice: str) -> None:
+        """セグメントごとに並行して音声合成し、1つの音声ファイルに連結"""
+        temp_root = Path(settings.temp_dir)
+        temp_root.mkdir(parents=True, exist_ok=True)
+        
+        with tempfile.TemporaryDirectory(dir=temp_root) as temp_dir:
+            segment_paths = [Path(temp_dir) / f"segment_{i:04d}.wav" for i in range(len(segments))]
+            
+            # プロバイダーの同時リクエスト数を超えないよう制限する
+            semaphore = asyncio.Semaphore(settings.tts_concurrency)
+            
+            async def synthesize(text: str, path: Path) -> None:
+                async with semaphore:
+                    await self._cached_synthesize(provider, text, path, voice)
+            
+            await asyncio.gather(*(
+                synthesize(text, path) for text, path in zip(segments, segment_paths)
+            ))
+            
+            await self._concat_audio(segment_paths, audio_path)
+    
+    async def _cached_synthesize(self, provider: TTSProvider, text: str,
+                                 output_path: Path, voice: str) -> None:
+        """同じプロバイダー・音声・テキストの合成結果があれば再利用し、なければ合成してキャッシュする"""
+        key = hashlib.sha256(f"{type(provider).__name__}|{voice}|{text}".encode('utf-8')).hexdigest()
+        cache_path = Path(settings.tts_cache_dir) / f"{key}.wav"
+        
+        if cache_path.exists():
+            await asyncio.to_thread(link_or_copy, cache_path, output_path)
+            return
+        
+        # 出力先がキャッシュとハードリンクされていると上書きで壊すため、先に外しておく
+        output_path.unlink(missing_ok=True)
+        await provider.synthesize_text(text, output_path, voice)
+        
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        await asyncio.to_thread(link_or_copy, output_path, cache_path)
+    
+    async def _concat_audio(self, segment_paths: List[Path], output_path: Path) -> None:
+        """ffmpegのconcat demuxerで再エンコードせずに音声を連結"""
+        list_path = segment_paths[0].with_name("segments.txt")
+        list_path.write_text(
+            "".join(f"file '{path.as_posix()}'\n" for path in segment_paths),
+            encoding='utf-8'
+        )
+        
+        # 出力先が前回の合成キャッシュとハードリンクされていると、ffmpegの上書きでキャッシュを壊すため先に外す
+        output_path.unlink(missing_ok=True)
+        
+        process = await asyncio.create_subprocess_exec(
+            settings.ffmpeg_path,
+            '-y', '-loglevel', 'error',
+            '-f', 'concat', '-safe', '0',
+            '-i', str(list_path),
+            '-c', 'copy',
+            str(output_path),
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        _, stderr = await process.communicate()
+        
+        if process.returncode != 0:
+            error_msg = stderr.decode('utf-8', errors='replace') if stderr else 'Unknown FFmpeg error'
+            raise RuntimeError(f"Audio concatenation failed: {error_msg}")
+    
     def _select_provider(self, voice: str) -> TTSProvider:
         """音声に基づいてプロバイダーを選択"""
         if voice.startswith('ja-JP') and 'azure' in self.providers:
@@ -187,31 +343,26 @@ class TTSEngine:
             raise RuntimeError("No suitable TTS provider available")
     
     async def _get_document_data(self, job_id: str) -> Dict:
-        """文書データを取得（実際の実装ではデータベースから）"""
-        # ダミーデータ
-        return {
-            'title': '数学解析の基礎',
-            'chapters': [
-                {
-                    'title': '微分積分学の基礎',
-                    'content': '微分積分学は、変化率と累積を扱う数学の分野です。導関数は関数の変化率を表し、積分は累積量を計算します。',
-                    'math_expressions': ['f prime of x equals the limit as h approaches 0 of f of x plus h minus f of x, all over h']
-                }
-            ]
-        }
+        """文書データを取得（スライド生成と共有するメモ化ローダー経由）"""
+        return await get_document(job_id)
     
     def _prepare_text_for_tts(self, document_data: Dict) -> str:
         """TTS用のテキストを準備"""
-        text_parts = []
+        # セグメントの間に空行を挟んで1つのテキストにする
+        segments = self._prepare_segments_for_tts(document_data)
+        return "\n".join(line for segment in segments for line in (segment, ""))
+    
+    def _prepare_segments_for_tts(self, document_data: Dict) -> List[str]:
+        """TTS用のテキストをタイトル・章ごとのセグメントに分けて準備"""
+        segments = []
         
         # タイトル
         if document_data.get('title'):
-            text_parts.append(f"タイトル: {document_data['title']}")
-            text_parts.append("")
+            segments.append(f"タイトル: {document_data['title']}")
         
         # 各章の内容
         for i, chapter in enumerate(document_data.get('chapters', []), 1):
-            text_parts.append(f"第{i}章: {chapter['title']}")
+            text_parts = [f"第{i}章: {chapter['title']}"]
             
             if chapter.get('content'):
                 text_parts.append(chapter['content'])
@@ -221,31 +372,22 @@ class TTSEngine:
                 math_text = self._convert_math_to_speech(math_expr)
                 text_parts.append(f"数式: {math_text}")
             
-            text_parts.append("")  # 章間の区切り
+            segments.append("\n".join(text_parts))
         
-        return "\n".join(text_parts)
+        return segments
     
     def _convert_math_to_speech(self, math_expr: str) -> str:
         """数式を読み上げ用テキストに変換"""
-        # 簡単な変換ルール（実際にはもっと複雑な処理が必要）
-        replacements = {
-            r'\frac{': '分数 ',
-            r'}{': ' 分の ',
-            r'}': '',
-            r'\lim_{': 'リミット ',
-            r'\to': 'が近づくとき',
-            r'\sum': '総和',
-            r'\int': '積分',
-            r'\sqrt{': 'ルート ',
-            r'^{': 'の',
-            r'_{': 'サブ',
-            r'\alpha': 'アルファ',
-            r'\beta': 'ベータ',
-            r'\gamma': 'ガンマ'
-        }
-        
-        result = math_expr
-        for pattern, replacement in replacements.items():
-            result = result.replace(pattern, replacement)
-        
-        return result
\ No newline at end of file
+        if _MATH_SPEECH_AUTOMATON is None:
+            # 全ルールを1つの正規表現にまとめ、1回の走査で置換する
+            return _MATH_SPEECH_RE.sub(lambda m: _MATH_SPEECH_MAP[m.group()], math_expr)
+        
+        # 左から最長一致で重ならないマッチを列挙し、1回の走査で組み立てる
+        parts = []
+        position = 0
+        for end, (length, replacement) in _MATH_SPEECH_AUTOMATON.iter_long(math_expr):
+            parts.append(math_expr[position:end - length + 1])
+            parts.append(replacement)
+            position = end + 1
+        parts.append(math_expr[position:])
+        return ''.join(parts)
\ No newline at end of file
@@ -1,23 +1,81 @@
 import asyncio
 import logging
+import os
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 import subprocess
-import json
-from moviepy.editor import VideoFileClip, AudioFileClip, CompositeVideoClip, ImageClip
-from moviepy.video.fx import resize
-from PIL import Image, ImageDraw, ImageFont
 import tempfile
 
 from ..config.settings import settings
+from ..utils.file_manager import scratch_root
 
 logger = logging.getLogger(__name__)
 
+# 優先して使うハードウェアエンコーダー（先頭ほど優先）
+_HW_ENCODERS = ('h264_nvenc', 'h264_videotoolbox', 'h264_qsv')
+
+def _encoder_options(encoder: str, bitrate: str) -> List[str]:
+    """エンコーダーごとのffmpeg映像エンコードオプション"""
+    if encoder == 'h264_nvenc':
+        return ['-c:v', encoder, '-preset', 'p4', '-rc', 'vbr', '-b:v', bitrate]
+    if encoder in ('h264_videotoolbox', 'h264_qsv'):
+        return ['-c:v', encoder, '-b:v', bitrate]
+    # 静止画が続くスライド動画向けのチューニング
+    return ['-c:v', 'libx264', '-preset', 'fast', '-tune', 'stillimage']
+
+def _video_filter(video_config: Dict) -> str:
+    """スライド画像を縦横比を保って動画サイズに収め、余白を埋めてフレームレートを揃えるフィルタ"""
+    width, height = video_config['width'], video_config['height']
+    return (
+        f"scale={width}:{height}:force_original_aspect_ratio=decrease:flags=lanczos,"
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,"
+        f"fps={video_config['fps']}"
+    )
+
+@lru_cache(maxsize=None)
+def _detect_video_encoder(ffmpeg_path: str) -> str:
+    """利用できるハードウェアエンコーダーを検出（なければlibx264）"""
+    try:
+        listed = subprocess.run(
+            [ffmpeg_path, '-hide_banner', '-encoders'],
+            capture_output=True, text=True, timeout=10
+        ).stdout
+    except (OSError, subprocess.SubprocessError):
+        return 'libx264'
+    
+    for encoder in _HW_ENCODERS:
+        if encoder not in listed:
+            continue
+        # ビルドに含まれていてもデバイスが無いことがあるので、1フレームだけ実際にエンコードして確かめる
+        try:
+            probe = subprocess.run(
+                [ffmpeg_path, '-hide_banner', '-loglevel', 'error',
+                 '-f', 'lavfi', '-i', 'color=size=256x256:duration=0.1',
+                 '-frames:v', '1', '-c:v', encoder, '-f', 'null', '-'],
+                capture_output=True, timeout=10
+            )
+        except (OSError, subprocess.SubprocessError):
+            continue
+        if probe.returncode == 0:
+            logger.info(f"Using hardware video encoder: {encoder}")
+            return encoder
+    
+    return 'libx264'
+
+def _concat_path(path: str) -> str:
+    """concat demuxerの一覧に書くパス（絶対パスにし、シングルクォートをエスケープ）"""
+    return Path(path).resolve().as_posix().replace("'", "'\\''")
+
 class VideoGenerator:
     """動画生成クラス"""
     
     def __init__(self):
         self.ffmpeg_path = settings.ffmpeg_path
+        self.ffprobe_path = settings.ffprobe_path
+        self.video_encoder = settings.hw_encoder or _detect_video_encoder(self.ffmpeg_path)
+        # (パス, 更新時刻) ごとの音声の長さ
+        self._duration_cache: Dict[Tuple[str, float], float] = {}
     
     async def generate_video(
         self, 
@@ -44,39 +102,32 @@ class VideoGenerator:
             video_path = Path(settings.output_dir) / f"{job_id}.mp4"
             video_path.parent.mkdir(parents=True, exist_ok=True)
             
-            # PDFを画像に変換
-            slide_images = await self._pdf_to_images(slides_path)
-            
-            # 音声の長さを取得
-            audio_duration = await self._get_audio_duration(audio_path)
-            
-            # 各スライドの表示時間を計算
-            slide_durations = self._calculate_slide_durations(
-                len(slide_images), audio_duration
-            )
-            
             # 動画品質設定
             video_config = self._get_video_config(quality)
             
-            # MoviePyを使用して動画を作成
-            video_clip = await self._create_video_with_moviepy(
-                slide_images, slide_durations, audio_path, video_config
-            )
-            
-            # チャプター情報を追加
-            if chapters:
-                chapter_data = await self._get_chapter_data(job_id)
-                await self._add_chapters_to_video(video_clip, video_path, chapter_data)
-            else:
-                video_clip.write_videofile(
-                    str(video_path),
-                    fps=video_config['fps'],
-                    codec='libx264',
-                    audio_codec='aac'
+            # スライド画像はジョブ専用の作業領域（可能ならtmpfs）に書き、エンコード後にまとめて消す
+            work_root = scratch_root(settings.scratch_dir, Path(settings.temp_dir))
+            with tempfile.TemporaryDirectory(dir=work_root, prefix=f"{job_id}_") as work_dir:
+                # PDFを動画の解像度の画像に変換
+                slide_images = await self._pdf_to_images(slides_path, video_config, Path(work_dir))
+                
+                # 音声の長さを取得
+                audio_duration = await self._get_audio_duration(audio_path)
+                
+                # 各スライドの表示時間を計算
+                slide_durations = self._calculate_slide_durations(
+                    len(slide_images), audio_duration
+                )
+                
+                # チャプター情報はエンコードと同じパスでメタデータとして埋め込む
+                metadata = None
+                if chapters:
+                    chapter_data = await self._get_chapter_data(job_id)
+                    metadata = self._convert_chapters_to_ffmpeg_format(chapter_data)
+                
+                await self._encode_video(
+                    slide_images, slide_durations, audio_path, video_config, video_path, metadata
                 )
-            
-            # リソースのクリーンアップ
-            video_clip.close()
             
             logger.info(f"Video generated successfully: {video_path}")
             return str(video_path)
@@ -85,22 +136,25 @@ class VideoGenerator:
             logger.error(f"Video generation error: {e}")
             raise
     
-    async def _pdf_to_images(self, pdf_path: str) -> List[str]:
-        """PDFを画像に変換"""
+    async def _pdf_to_images(self, pdf_path: str, video_config: Dict, output_dir: Path) -> List[str]:
+        """PDFを動画の解像度でJPEG画像に変換"""
         try:
             from pdf2image import convert_from_path
             
-            # PDFを画像に変換
-            images = convert_from_path(pdf_path, dpi=300)
-            
-            image_paths = []
-            temp_dir = Path(settings.temp_dir) / "slides"
-            temp_dir.mkdir(parents=True, exist_ok=True)
-            
-            for i, image in enumerate(images):
-                image_path = temp_dir / f"slide_{i+1:03d}.png"
-                image.save(image_path, 'PNG')
-                image_paths.append(str(image_path))
+            # 高解像度で描画してから縮小せず、動画の高さに合わせて直接描画する
+            # popplerが直接ファイルに書き出すので、PILで読み込み・保存し直さない
+            # ページ範囲をコア数ぶんのpdftocairoプロセスに分けて並列に描画する
+            image_paths = await asyncio.to_thread(
+                convert_from_path,
+                pdf_path,
+                output_folder=output_dir,
+                thread_count=os.cpu_count() or 1,
+                use_pdftocairo=True,
+                fmt='jpeg',
+                jpegopt={'quality': 90},
+                size=(None, video_config['height']),
+                paths_only=True
+            )
             
             logger.info(f"Converted {len(image_paths)} slides to images")
             return image_paths
@@ -111,11 +165,28 @@ class VideoGenerator:
             raise RuntimeError(f"PDF to image conversion failed: {e}")
     
     async def _get_audio_duration(self, audio_path: str) -> float:
-        """音声ファイルの長さを取得"""
+        """音声ファイルの長さを取得（ffprobeでコンテナのヘッダーだけを読む）"""
         try:
-            audio_clip = AudioFileClip(audio_path)
-            duration = audio_clip.duration
-            audio_clip.close()
+            key = (str(audio_path), os.stat(audio_path).st_mtime)
+            if key in self._duration_cache:
+                return self._duration_cache[key]
+            
+            process = await asyncio.create_subprocess_exec(
+                self.ffprobe_path,
+                '-v', 'error',
+                '-show_entries', 'format=duration',
+                '-of', 'default=nw=1:nk=1',
+                str(audio_path),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            stdout, stderr = await process.communicate()
+            
+            if process.returncode != 0:
+                raise RuntimeError(stderr.decode('utf-8', errors='replace') or 'Unknown ffprobe error')
+            
+            duration = float(stdout)
+            self._duration_cache[key] = duration
             return duration
         except Exception as e:
             raise RuntimeError(f"Failed to get audio duration: {e}")
@@ -138,41 +209,68 @@ class VideoGenerator:
         }
         return configs.get(quality, configs["1080p"])
     
-    async def _create_video_with_moviepy(
-        self, 
-        slide_images: List[str], 
+    def _build_concat_list(self, slide_images: List[str], slide_durations: List[float]) -> str:
+        """ffmpeg concat demuxer用のスライド一覧（表示時間付き）を作成"""
+        entries = []
+        for image_path, duration in zip(slide_images, slide_durations):
+            entries.append(f"file '{_concat_path(image_path)}'\nduration {duration:.3f}\n")
+        
+        # 最後のエントリのdurationは、同じファイルをもう一度並べないと反映されない
+        if slide_images:
+            entries.append(f"file '{_concat_path(slide_images[-1])}'\n")
+        
+        return "".join(entries)
+    
+    async def _encode_video(
+        self,
+        slide_images: List[str],
         slide_durations: List[float],
         audio_path: str,
-        video_config: Dict
-    ) -> CompositeVideoClip:
-        """MoviePyを使用して動画を作成"""
+        video_config: Dict,
+        output_path: Path,
+        metadata: Optional[str] = None
+    ) -> None:
+        """スライド画像と音声をffmpegで直接エンコード（フレームをPython側で扱わない）"""
+        concat_file = output_path.with_suffix('.slides.txt')
+        concat_file.write_text(
+            self._build_concat_list(slide_images, slide_durations),
+            encoding='utf-8'
+        )
+        
         try:
-            clips = []
-            current_time = 0
-            
-            for i, (image_path, duration) in enumerate(zip(slide_images, slide_durations)):
-                # 画像クリップを作成
-                img_clip = ImageClip(image_path)
-                img_clip = img_clip.set_duration(duration)
-                img_clip = img_clip.set_start(current_time)
-                
-                # リサイズ
-                img_clip = img_clip.resize((video_config['width'], video_config['height']))
-                
-                clips.append(img_clip)
-                current_time += duration
+            cmd = [
+                self.ffmpeg_path,
+                '-y', '-loglevel', 'error',
+                '-f', 'concat', '-safe', '0',
+                '-i', str(concat_file),
+                '-i', str(audio_path),
+                # チャプターは標準入力から渡す3番目の入力（FFMETADATA）から取り込む
+                *(['-f', 'ffmetadata', '-i', 'pipe:0', '-map_metadata', '2', '-map_chapters', '2']
+                  if metadata else []),
+                '-map', '0:v', '-map', '1:a',
+                '-vf', _video_filter(video_config),
+                *_encoder_options(self.video_encoder, video_config['bitrate']),
+                '-pix_fmt', 'yuv420p',
+                '-c:a', 'aac',
+                '-shortest',
+                str(output_path)
+            ]
             
-            # 動画を合成
-            video = CompositeVideoClip(clips)
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.PIPE if metadata else asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE
+            )
             
-            # 音声を追加
-            audio = AudioFileClip(audio_path)
-            video = video.set_audio(audio)
+            _, stderr = await process.communicate(metadata.encode('utf-8') if metadata else None)
             
-            return video
+            if process.returncode != 0:
+                error_msg = stderr.decode('utf-8', errors='replace') if stderr else 'Unknown FFmpeg error'
+                raise RuntimeError(f"FFmpeg video encoding failed: {error_msg}")
             
-        except Exception as e:
-            raise RuntimeError(f"Video creation with MoviePy failed: {e}")
+        finally:
+            concat_file.unlink(missing_ok=True)
     
     async def _get_chapter_data(self, job_id: str) -> List[Dict]:
         """チャプターデータを取得"""
@@ -190,82 +288,8 @@ class VideoGenerator:
             }
         ]
     
-    async def _add_chapters_to_video(self, video_clip: CompositeVideoClip, output_path: Path, chapters: List[Dict]):
-        """動画にチャプター情報を追加"""
-        try:
-            # 一時的にビデオファイルを保存
-            temp_video = output_path.with_suffix('.temp.mp4')
-            video_clip.write_videofile(
-                str(temp_video),
-                fps=30,
-                codec='libx264',
-                audio_codec='aac'
-            )
-            
-            # チャプター情報をJSON形式で準備
-            chapter_file = output_path.with_suffix('.chapters')
-            with open(chapter_file, 'w', encoding='utf-8') as f:
-                json.dump(chapters, f, ensure_ascii=False, indent=2)
-            
-            # FFmpegでチャプター情報を埋め込み
-            await self._embed_chapters_with_ffmpeg(temp_video, output_path, chapter_file)
-            
-            # 一時ファイルを削除
-            temp_video.unlink()
-            chapter_file.unlink()
-            
-        except Exception as e:
-            logger.warning(f"Failed to add chapters: {e}")
-            # チャプター追加に失敗した場合は通常の動画として保存
-            video_clip.write_videofile(
-                str(output_path),
-                fps=30,
-                codec='libx264',
-                audio_codec='aac'
-            )
-    
-    async def _embed_chapters_with_ffmpeg(self, input_path: Path, output_path: Path, chapter_file: Path):
-        """FFmpegを使用してチャプター情報を埋め込み"""
-        try:
-            # チャプターファイルをFFmpeg形式に変換
-            ffmpeg_chapters = self._convert_chapters_to_ffmpeg_format(chapter_file)
-            
-            ffmpeg_chapter_file = chapter_file.with_suffix('.txt')
-            with open(ffmpeg_chapter_file, 'w', encoding='utf-8') as f:
-                f.write(ffmpeg_chapters)
-            
-            # FFmpegコマンドを実行
-            cmd = [
-                self.ffmpeg_path,
-                '-i', str(input_path),
-                '-i', str(ffmpeg_chapter_file),
-                '-map', '0',
-                '-map_metadata', '1',
-                '-c', 'copy',
-                str(output_path)
-            ]
-            
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            stdout, stderr = await process.communicate()
-            
-            if process.returncode != 0:
-                raise RuntimeError(f"FFmpeg chapter embedding failed: {stderr.decode()}")
-            
-            ffmpeg_chapter_file.unlink()
-            
-        except Exception as e:
-            raise RuntimeError(f"Chapter embedding error: {e}")
-    
-    def _convert_chapters_to_ffmpeg_format(self, chapter_file: Path) -> str:
+    def _convert_chapters_to_ffmpeg_format(self, chapters: List[Dict]) -> str:
         """チャプター情報をFFmpeg形式に変換"""
-        with open(chapter_file, 'r', encoding='utf-8') as f:
-            chapters = json.load(f)
-        
         ffmpeg_format = ";FFMETADATA1\n"
         
         for chapter in chapters:
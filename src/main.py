@@ -1,7 +1,9 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
+import os
 import uvicorn
 
 from .config.settings import settings
@@ -12,7 +14,9 @@ app = FastAPI(
     title=settings.app_name,
     version=settings.app_version,
     description="Automatic video generation system for mathematical textbooks and papers",
-    debug=settings.debug
+    debug=settings.debug,
+    # ステータス確認など頻繁に呼ばれるエンドポイントのJSONシリアライズを高速化
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -43,5 +47,9 @@ if __name__ == "__main__":
         "src.main:app",
         host=settings.host,
         port=settings.port,
+        # --reloadとマルチワーカーは併用できないため、開発時は1プロセスで動かす
+        workers=1 if settings.debug else (settings.workers or os.cpu_count()),
+        loop="uvloop",
+        http="httptools",
         reload=settings.debug
     )
\ No newline at end of file
@@ -1,9 +1,16 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Enum
-from sqlalchemy.ext.declarative import declarative_base
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import Integer, String, Text, DateTime, JSON, Enum, Index
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 from sqlalchemy.sql import func
 from enum import Enum as PyEnum
 
-Base = declarative_base()
+# PostgreSQLではバイナリ形式のJSONBで保存し（読み出し時の再パース不要・インデックス可能）、他のDBでは汎用JSON
+_JSON_TYPE = JSON().with_variant(JSONB(), "postgresql")
+
+class Base(DeclarativeBase):
+    pass
 
 class DocumentType(PyEnum):
     PDF = "pdf"
@@ -21,32 +28,43 @@ class ProcessingStatus(PyEnum):
 
 class Document(Base):
     __tablename__ = "documents"
+    __table_args__ = (
+        # チャプターのメタデータを包含検索（@>）するためのGINインデックス
+        Index(
+            "ix_documents_chapters_gin",
+            "chapters",
+            postgresql_using="gin",
+            postgresql_ops={"chapters": "jsonb_path_ops"}
+        ),
+    )
     
-    id = Column(Integer, primary_key=True, index=True)
-    filename = Column(String, nullable=False)
-    original_filename = Column(String, nullable=False)
-    file_path = Column(String, nullable=False)
-    document_type = Column(Enum(DocumentType), nullable=False)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    filename: Mapped[str] = mapped_column(String, nullable=False)
+    original_filename: Mapped[str] = mapped_column(String, nullable=False)
+    file_path: Mapped[str] = mapped_column(String, nullable=False)
+    document_type: Mapped[DocumentType] = mapped_column(Enum(DocumentType), nullable=False)
     
     # Metadata
-    title = Column(String)
-    author = Column(String)
-    abstract = Column(Text)
+    title: Mapped[Optional[str]] = mapped_column(String)
+    author: Mapped[Optional[str]] = mapped_column(String)
+    abstract: Mapped[Optional[str]] = mapped_column(Text)
     
     # Processing
-    status = Column(Enum(ProcessingStatus), default=ProcessingStatus.UPLOADED)
-    error_message = Column(Text)
-    processing_config = Column(JSON)
+    status: Mapped[Optional[ProcessingStatus]] = mapped_column(
+        Enum(ProcessingStatus), default=ProcessingStatus.UPLOADED
+    )
+    error_message: Mapped[Optional[str]] = mapped_column(Text)
+    processing_config: Mapped[Optional[Dict[str, Any]]] = mapped_column(_JSON_TYPE)
     
     # Structure
-    chapters = Column(JSON)  # List of chapter metadata
-    total_pages = Column(Integer)
+    chapters: Mapped[Optional[List[Dict[str, Any]]]] = mapped_column(_JSON_TYPE)  # List of chapter metadata
+    total_pages: Mapped[Optional[int]] = mapped_column(Integer)
     
     # Output
-    video_path = Column(String)
-    slides_path = Column(String)
-    audio_path = Column(String)
+    video_path: Mapped[Optional[str]] = mapped_column(String)
+    slides_path: Mapped[Optional[str]] = mapped_column(String)
+    audio_path: Mapped[Optional[str]] = mapped_column(String)
     
     # Timestamps
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), onupdate=func.now())
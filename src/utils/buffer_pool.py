@@ -0,0 +1,42 @@
+import queue
+from contextlib import contextmanager
+from typing import Iterator
+
+class BufferPool:
+    """固定サイズのバイトバッファを再利用するプール"""
+
+    def __init__(self, size: int, count: int):
+        """
+        Args:
+            size: バッファ1つあたりのバイト数
+            count: プールに保持するバッファの最大数
+        """
+        self.size = size
+        # 直近に返却された（キャッシュに載っている）バッファから再利用する
+        self._buffers = queue.LifoQueue(maxsize=count)
+
+    def acquire(self) -> bytearray:
+        """バッファを取得（空いていなければ新規に確保）"""
+        try:
+            return self._buffers.get_nowait()
+        except queue.Empty:
+            return bytearray(self.size)
+
+    def release(self, buffer: bytearray) -> None:
+        """バッファを返却（プールが満杯なら破棄）"""
+        if len(buffer) != self.size:
+            return
+
+        try:
+            self._buffers.put_nowait(buffer)
+        except queue.Full:
+            pass
+
+    @contextmanager
+    def buffer(self) -> Iterator[bytearray]:
+        """with文でバッファを借りて自動的に返却"""
+        buffer = self.acquire()
+        try:
+            yield buffer
+        finally:
+            self.release(buffer)
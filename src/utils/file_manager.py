@@ -1,13 +1,192 @@
 import logging
 import hashlib
+import mmap
+import os
 import shutil
+import time
+import uuid
+from stat import S_ISREG
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 import json
 from datetime import datetime, timedelta
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# これ以上のサイズのファイルはmmapして1回のupdateでハッシュする（ループをすべてC側で回す）
+_MMAP_HASH_THRESHOLD = 8 * 1024 * 1024
+
+# hashlib.file_digestが無い環境で使う読み込み単位
+_HASH_BUFSIZE = 1024 * 1024
+
+# get_file_infoでハッシュを計算するファイルサイズの上限（巨大な動画をメタデータ取得のついでにハッシュしない）
+_INFO_HASH_LIMIT = 1024 * 1024 * 1024
+
+# get_disk_usageの結果を使い回す秒数（ダッシュボードの定期取得のたびにツリー全体を走査しない）
+_DISK_USAGE_TTL = 30.0
+
+# Linuxのioctl FICLONE（btrfs/xfsなどでデータブロックを共有するコピーを作る）
+_FICLONE = 0x40049409
+
+# アーカイブ書き込み時のバッファサイズ
+_ARCHIVE_BUFSIZE = 4 * 1024 * 1024
+
+# 既に圧縮済みの形式。DEFLATEしてもほとんど縮まないので無圧縮で格納する
+_COMPRESSED_EXTS = frozenset({
+    '.png', '.jpg', '.jpeg', '.gif',
+    '.mp4', '.mkv', '.webm', '.mov',
+    '.mp3', '.m4a', '.aac',
+    '.zip', '.gz', '.xz'
+})
+
+def link_or_copy(src: Path, dst: Path) -> None:
+    """ハードリンクで複製（別ファイルシステムなどで失敗したらコピー）"""
+    dst.unlink(missing_ok=True)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+def _reflink(src: Path, dst: Path) -> bool:
+    """コピーオンライトの複製（reflink）を作成。対応していなければFalse
+
+    dstは新規に作成する（既存のファイルは書き換えず、FileExistsErrorになる）
+    """
+    if not FCNTL_AVAILABLE:
+        return False
+    with open(src, 'rb') as s, open(dst, 'xb') as d:
+        try:
+            fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+            cloned = True
+        except OSError:
+            cloned = False
+    if not cloned:
+        dst.unlink()
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+def _temp_sibling(path: Path) -> Path:
+    """pathと同じディレクトリの一時ファイル名（os.replaceで置き換えるための書き込み先）"""
+    return path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+
+def _reserve_unique_path(directory: Path, stem: str, suffix: str) -> Path:
+    """directory内で未使用のファイル名をO_EXCLで作成して確保（同名があれば連番を付ける）"""
+    counter = 0
+    while True:
+        name = f"{stem}_{counter}{suffix}" if counter else f"{stem}{suffix}"
+        path = directory / name
+        try:
+            os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+            return path
+        except FileExistsError:
+            counter += 1
+
+def scratch_root(preferred: Optional[str], fallback: Path) -> Path:
+    """中間ファイル用の作業領域（tmpfsなど指定先に書き込めればそこ、なければfallback）"""
+    if preferred:
+        path = Path(preferred)
+        if path.is_dir() and os.access(path, os.W_OK):
+            return path
+    fallback.mkdir(parents=True, exist_ok=True)
+    return fallback
+
+def _dump_manifest(manifest: Dict) -> bytes:
+    """マニフェストをインデント付きのUTF-8 JSONに変換（orjsonがあればそちらで高速に）"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(manifest, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(manifest, indent=2, ensure_ascii=False).encode('utf-8')
+
+def _scandir_recursive(path) -> Iterator[os.DirEntry]:
+    """配下のエントリを再帰的に列挙（DirEntryがキャッシュした種別を使い、stat回数を抑える）
+
+    ディレクトリは中身を列挙した後に返すので、空になったディレクトリをその場で削除できる
+    """
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _scandir_recursive(entry.path)
+            yield entry
+
+def _fast_rmtree(path) -> None:
+    """ディレクトリツリーを削除（DirEntryの種別を使いstatせず、再帰の代わりにスタックでたどる）"""
+    # (パス, 中身を削除済みか)。中身を消し終えたディレクトリは後からrmdirする
+    stack = [(os.fspath(path), False)]
+    while stack:
+        current, emptied = stack.pop()
+        if emptied:
+            os.rmdir(current)
+            continue
+        
+        stack.append((current, True))
+        with os.scandir(current) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((entry.path, False))
+                else:
+                    os.unlink(entry.path)
+
+def _is_empty_dir(path: str) -> bool:
+    """ディレクトリが空かどうか"""
+    with os.scandir(path) as entries:
+        return next(entries, None) is None
+
+# ディレクトリのファイル記述子を基準にunlink/rmdirできるか（できなければパス指定で削除する）
+_DIR_FD_SUPPORTED = (
+    os.scandir in os.supports_fd
+    and os.unlink in os.supports_dir_fd
+    and os.rmdir in os.supports_dir_fd
+    and os.open in os.supports_dir_fd
+)
+
+def _remove_old_entries_at(dir_fd: int, cutoff_ts: float) -> int:
+    """dir_fd配下の古いファイル（シンボリックリンクを含む）と空ディレクトリを削除し、削除したファイル数を返す
+
+    名前はディレクトリの記述子からの相対で解決するので、削除のたびにパス全体をたどり直さない
+    """
+    removed = 0
+    with os.scandir(dir_fd) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                child_fd = os.open(entry.name, os.O_RDONLY | os.O_DIRECTORY, dir_fd=dir_fd)
+                try:
+                    removed += _remove_old_entries_at(child_fd, cutoff_ts)
+                    with os.scandir(child_fd) as children:
+                        is_empty = next(children, None) is None
+                finally:
+                    os.close(child_fd)
+                if is_empty:
+                    # 空のディレクトリを削除
+                    os.rmdir(entry.name, dir_fd=dir_fd)
+                    logger.debug(f"Removed empty directory: {entry.name}")
+            elif entry.is_file(follow_symlinks=False) or entry.is_symlink():
+                # シンボリックリンクはリンク自体の更新時刻で判定し、リンクだけを削除する
+                if entry.stat(follow_symlinks=False).st_mtime < cutoff_ts:
+                    os.unlink(entry.name, dir_fd=dir_fd)
+                    removed += 1
+                    logger.debug(f"Removed old file: {entry.name}")
+    return removed
+
+def _iter_job_entries(directory: Path, job_id: str) -> Iterator[os.DirEntry]:
+    """ディレクトリ直下のジョブ関連ファイル（名前がjob_idで始まるもの）を列挙"""
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.startswith(job_id) and entry.is_file(follow_symlinks=False):
+                yield entry
+
 class FileManager:
     """ファイル管理ユーティリティ"""
     
@@ -20,6 +199,9 @@ class FileManager:
         # ディレクトリを作成
         for directory in [self.upload_dir, self.output_dir, self.temp_dir]:
             directory.mkdir(parents=True, exist_ok=True)
+        
+        # (有効期限, ディスク使用量)
+        self._disk_usage_cache: Optional[Tuple[float, Dict[str, Dict[str, int]]]] = None
     
     def save_uploaded_file(self, file_content: bytes, filename: str, job_id: str) -> Path:
         """アップロードされたファイルを保存"""
@@ -37,15 +219,24 @@ class FileManager:
         logger.info(f"File saved: {file_path}")
         return file_path
     
-    def get_file_hash(self, file_path: Path) -> str:
+    def get_file_hash(self, file_path: Union[str, Path]) -> str:
         """ファイルのSHA256ハッシュを計算"""
-        sha256_hash = hashlib.sha256()
-        
-        with open(file_path, 'rb') as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(chunk)
-        
-        return sha256_hash.hexdigest()
+        # 自前で大きな単位で読むので、Python側のバッファリングは無効にする
+        with open(file_path, 'rb', buffering=0) as f:
+            if os.fstat(f.fileno()).st_size >= _MMAP_HASH_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return hashlib.sha256(mapped).hexdigest()
+            
+            # Python 3.11以降はhashlib側で大きなバッファを使い、GILを解放しながら読み込む
+            if hasattr(hashlib, 'file_digest'):
+                return hashlib.file_digest(f, 'sha256').hexdigest()
+            
+            sha256_hash = hashlib.sha256()
+            buf = bytearray(_HASH_BUFSIZE)
+            with memoryview(buf) as view:
+                while n := f.readinto(buf):
+                    sha256_hash.update(view[:n])
+            return sha256_hash.hexdigest()
     
     def create_temp_directory(self, job_id: str) -> Path:
         """ジョブ用の一時ディレクトリを作成"""
@@ -57,9 +248,11 @@ class FileManager:
         """ジョブの一時ファイルを清掃"""
         try:
             temp_job_dir = self.temp_dir / job_id
-            if temp_job_dir.exists():
-                shutil.rmtree(temp_job_dir)
-                logger.info(f"Cleaned up temp files for job: {job_id}")
+            try:
+                _fast_rmtree(temp_job_dir)
+            except FileNotFoundError:
+                return True
+            logger.info(f"Cleaned up temp files for job: {job_id}")
             return True
         except Exception as e:
             logger.error(f"Failed to cleanup temp files for {job_id}: {e}")
@@ -67,7 +260,7 @@ class FileManager:
     
     def cleanup_old_files(self, max_age_days: int = 7) -> Dict[str, int]:
         """古いファイルを清掃"""
-        cutoff_date = datetime.now() - timedelta(days=max_age_days)
+        cutoff_ts = (datetime.now() - timedelta(days=max_age_days)).timestamp()
         cleaned_counts = {
             'uploads': 0,
             'outputs': 0,
@@ -80,33 +273,50 @@ class FileManager:
             ('temp', self.temp_dir)
         ]:
             try:
-                for file_path in directory.rglob('*'):
-                    if file_path.is_file():
-                        file_time = datetime.fromtimestamp(file_path.stat().st_mtime)
-                        if file_time < cutoff_date:
-                            file_path.unlink()
+                if _DIR_FD_SUPPORTED:
+                    dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+                    try:
+                        cleaned_counts[dir_name] += _remove_old_entries_at(dir_fd, cutoff_ts)
+                    finally:
+                        os.close(dir_fd)
+                    continue
+                
+                for entry in _scandir_recursive(directory):
+                    if entry.is_file(follow_symlinks=False) or entry.is_symlink():
+                        if entry.stat(follow_symlinks=False).st_mtime < cutoff_ts:
+                            os.unlink(entry.path)
                             cleaned_counts[dir_name] += 1
-                            logger.debug(f"Removed old file: {file_path}")
-                    elif file_path.is_dir() and not any(file_path.iterdir()):
+                            logger.debug(f"Removed old file: {entry.path}")
+                    elif entry.is_dir(follow_symlinks=False) and _is_empty_dir(entry.path):
                         # 空のディレクトリを削除
-                        file_path.rmdir()
-                        logger.debug(f"Removed empty directory: {file_path}")
+                        os.rmdir(entry.path)
+                        logger.debug(f"Removed empty directory: {entry.path}")
             except Exception as e:
                 logger.error(f"Error cleaning {dir_name}: {e}")
         
+        self._disk_usage_cache = None
         logger.info(f"Cleanup completed: {cleaned_counts}")
         return cleaned_counts
     
-    def get_disk_usage(self) -> Dict[str, Dict[str, int]]:
-        """ディスク使用量を取得"""
+    def get_disk_usage(self, max_age: float = _DISK_USAGE_TTL) -> Dict[str, Dict[str, int]]:
+        """
+        ディスク使用量を取得
+        
+        Args:
+            max_age: 前回の集計結果をそのまま返してよい秒数（0なら必ず集計し直す）
+        """
+        cached = self._disk_usage_cache
+        if cached is not None and max_age > 0 and time.monotonic() - cached[0] < max_age:
+            return cached[1]
+        
         def get_directory_size(path: Path) -> Tuple[int, int]:
             """bytes, file_count"""
             total_size = 0
             file_count = 0
             
-            for file_path in path.rglob('*'):
-                if file_path.is_file():
-                    total_size += file_path.stat().st_size
+            for entry in _scandir_recursive(path):
+                if entry.is_file(follow_symlinks=False):
+                    total_size += entry.stat(follow_symlinks=False).st_size
                     file_count += 1
             
             return total_size, file_count
@@ -125,6 +335,7 @@ class FileManager:
                 'file_count': count
             }
         
+        self._disk_usage_cache = (time.monotonic(), usage)
         return usage
     
     def validate_file_type(self, file_path: Path, allowed_extensions: List[str]) -> bool:
@@ -135,30 +346,56 @@ class FileManager:
         """ファイルサイズを検証"""
         return file_path.stat().st_size <= max_size_bytes
     
-    def backup_file(self, source_path: Path, backup_dir: Optional[Path] = None) -> Path:
-        """ファイルをバックアップ"""
+    def backup_file(self, source_path: Path, backup_dir: Optional[Path] = None,
+                    prefer_links: bool = False) -> Path:
+        """
+        ファイルをバックアップ
+        
+        元ファイルと中身を共有しない独立した複製（reflinkまたは通常のコピー）を作る。
+        prefer_links=Trueなら、同じファイルシステム上ではハードリンクにしてデータをコピーしない
+        （元ファイルをその場で書き換えるとバックアップも変わるので、書き換えないファイルに限る）
+        """
         if backup_dir is None:
             backup_dir = self.base_dir / "backups"
         
         backup_dir.mkdir(parents=True, exist_ok=True)
         
-        # タイムスタンプ付きファイル名
+        # タイムスタンプ付きファイル名（同じ秒に複数回取っても上書きしないよう、名前を先に確保する）
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_filename = f"{source_path.stem}_{timestamp}{source_path.suffix}"
-        backup_path = backup_dir / backup_filename
+        backup_path = _reserve_unique_path(backup_dir, f"{source_path.stem}_{timestamp}", source_path.suffix)
         
-        shutil.copy2(source_path, backup_path)
+        # 一時ファイルに書き出してから、確保した名前へ置き換える
+        temp_path = _temp_sibling(backup_path)
+        try:
+            linked = False
+            if prefer_links:
+                try:
+                    os.link(source_path, temp_path)
+                    linked = True
+                except OSError:
+                    pass
+            
+            if not linked and not _reflink(source_path, temp_path):
+                shutil.copy2(source_path, temp_path)
+            os.replace(temp_path, backup_path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            backup_path.unlink(missing_ok=True)
+            raise
         logger.info(f"File backed up: {source_path} -> {backup_path}")
         
         return backup_path
     
     def restore_file(self, backup_path: Path, restore_path: Path) -> bool:
-        """ファイルを復元"""
+        """ファイルを復元（一時ファイルに書き出してから置き換え、既存ファイルの中身は書き換えない）"""
+        temp_path = _temp_sibling(restore_path)
         try:
-            shutil.copy2(backup_path, restore_path)
+            shutil.copy2(backup_path, temp_path)
+            os.replace(temp_path, restore_path)
             logger.info(f"File restored: {backup_path} -> {restore_path}")
             return True
         except Exception as e:
+            temp_path.unlink(missing_ok=True)
             logger.error(f"Failed to restore file: {e}")
             return False
     
@@ -171,46 +408,86 @@ class FileManager:
         }
         
         # 各ディレクトリでジョブ関連ファイルを検索
+        job_files = []
         for dir_name, directory in [
             ('uploads', self.upload_dir),
             ('outputs', self.output_dir),
             ('temp', self.temp_dir)
         ]:
-            job_files = list(directory.glob(f"{job_id}*"))
-            
             manifest['files'][dir_name] = []
-            for file_path in job_files:
-                if file_path.is_file():
-                    manifest['files'][dir_name].append({
-                        'filename': file_path.name,
-                        'size_bytes': file_path.stat().st_size,
-                        'modified_at': datetime.fromtimestamp(
-                            file_path.stat().st_mtime
-                        ).isoformat(),
-                        'hash': self.get_file_hash(file_path)
-                    })
+            for entry in _iter_job_entries(directory, job_id):
+                job_files.append((dir_name, entry, entry.stat(follow_symlinks=False)))
+        
+        # hashlibはハッシュ計算中にGILを解放するので、ファイルごとにスレッドで並列に計算する
+        with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:
+            hashes = executor.map(self.get_file_hash, [entry.path for _, entry, _ in job_files])
+            
+            for (dir_name, entry, stat), file_hash in zip(job_files, hashes):
+                manifest['files'][dir_name].append({
+                    'filename': entry.name,
+                    'size_bytes': stat.st_size,
+                    'modified_at': datetime.fromtimestamp(stat.st_mtime).isoformat(),
+                    'hash': file_hash
+                })
         
         # マニフェストを保存
         manifest_path = self.base_dir / f"{job_id}_manifest.json"
-        with open(manifest_path, 'w', encoding='utf-8') as f:
-            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        manifest_path.write_bytes(_dump_manifest(manifest))
         
         return manifest
     
     def verify_file_integrity(self, file_path: Path, expected_hash: str) -> bool:
         """ファイルの整合性を検証"""
-        if not file_path.exists():
+        # 存在確認のstatはせず、開けなければ（消えた・ディレクトリ・権限なし等）不一致とする
+        try:
+            actual_hash = self.get_file_hash(file_path)
+        except OSError:
             return False
-        
-        actual_hash = self.get_file_hash(file_path)
         return actual_hash == expected_hash
     
-    def get_file_info(self, file_path: Path) -> Dict:
-        """ファイル情報を取得"""
-        if not file_path.exists():
+    def verify_manifest(self, manifest_path: Path) -> Dict[str, bool]:
+        """
+        マニフェストに記録された全ファイルの整合性を検証
+        
+        Returns:
+            "ディレクトリ名/ファイル名" -> ハッシュが一致したか
+        """
+        manifest_bytes = Path(manifest_path).read_bytes()
+        manifest = orjson.loads(manifest_bytes) if ORJSON_AVAILABLE else json.loads(manifest_bytes)
+        
+        directories = {
+            'uploads': self.upload_dir,
+            'outputs': self.output_dir,
+            'temp': self.temp_dir
+        }
+        targets = [
+            (f"{dir_name}/{file_info['filename']}", directories[dir_name] / file_info['filename'], file_info['hash'])
+            for dir_name, files in manifest['files'].items()
+            for file_info in files
+        ]
+        
+        # ハッシュ計算はGILを解放するので、マニフェスト作成時と同じくスレッドで並列に検証する
+        with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:
+            results = executor.map(
+                lambda target: self.verify_file_integrity(target[1], target[2]), targets
+            )
+            return {name: ok for (name, _, _), ok in zip(targets, results)}
+    
+    def get_file_info(self, file_path: Path, max_hash_bytes: Optional[int] = _INFO_HASH_LIMIT) -> Dict:
+        """
+        ファイル情報を取得（statは1回だけ）
+        
+        Args:
+            file_path: ファイルパス
+            max_hash_bytes: これより大きいファイルはハッシュを計算しない（Noneなら無制限）
+        """
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
             return {}
         
-        stat = file_path.stat()
+        is_file = S_ISREG(stat.st_mode)
+        should_hash = is_file and (max_hash_bytes is None or stat.st_size <= max_hash_bytes)
         
         return {
             'name': file_path.name,
@@ -219,8 +496,8 @@ class FileManager:
             'created_at': datetime.fromtimestamp(stat.st_ctime).isoformat(),
             'modified_at': datetime.fromtimestamp(stat.st_mtime).isoformat(),
             'extension': file_path.suffix,
-            'is_readable': file_path.exists() and file_path.is_file(),
-            'hash': self.get_file_hash(file_path) if file_path.is_file() else None
+            'is_readable': is_file and os.access(file_path, os.R_OK),
+            'hash': self.get_file_hash(file_path) if should_hash else None
         }
     
     def archive_job_files(self, job_id: str, archive_path: Optional[Path] = None) -> Path:
@@ -230,24 +507,27 @@ class FileManager:
         if archive_path is None:
             archive_path = self.base_dir / f"{job_id}_archive.zip"
         
-        with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        # アーカイブへの細かい書き込みは4MiBのバッファにまとめてから書き出す
+        # テキストやJSONだけを高速な圧縮レベルでDEFLATEする
+        with open(archive_path, 'wb', buffering=_ARCHIVE_BUFSIZE) as archive_file, \
+                zipfile.ZipFile(archive_file, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zipf:
             # 各ディレクトリからジョブ関連ファイルを集める
             for dir_name, directory in [
                 ('uploads', self.upload_dir),
                 ('outputs', self.output_dir)
             ]:
-                job_files = list(directory.glob(f"{job_id}*"))
-                
-                for file_path in job_files:
-                    if file_path.is_file():
-                        # アーカイブ内のパス
-                        arcname = f"{dir_name}/{file_path.name}"
-                        zipf.write(file_path, arcname)
+                for entry in _iter_job_entries(directory, job_id):
+                    compress_type = (
+                        zipfile.ZIP_STORED
+                        if os.path.splitext(entry.name)[1].lower() in _COMPRESSED_EXTS
+                        else zipfile.ZIP_DEFLATED
+                    )
+                    # アーカイブ内のパス
+                    zipf.write(entry.path, f"{dir_name}/{entry.name}", compress_type=compress_type)
             
             # マニフェストも含める
             manifest = self.create_file_manifest(job_id)
-            manifest_json = json.dumps(manifest, indent=2, ensure_ascii=False)
-            zipf.writestr(f"{job_id}_manifest.json", manifest_json)
+            zipf.writestr(f"{job_id}_manifest.json", _dump_manifest(manifest))
         
         logger.info(f"Job files archived: {archive_path}")
         return archive_path
\ No newline at end of file
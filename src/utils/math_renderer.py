@@ -1,15 +1,104 @@
+import hashlib
 import logging
+import os
 import tempfile
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from itertools import repeat
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import subprocess
 import re
+import threading
 from PIL import Image, ImageDraw, ImageFont
 import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.font_manager import FontProperties
+from matplotlib.mathtext import MathTextParser
 import matplotlib.mathtext as mathtext
 
+from .file_manager import link_or_copy
+from .process_pool import discard_process_pool, get_process_pool, process_pool_size
+
 logger = logging.getLogger(__name__)
 
+# 数式画像の周囲の余白（インチ）
+_PAD_INCHES = 0.1
+
+# 異なる数式がこの数以上あるときは、プロセスを分けて並列に描画する
+_PARALLEL_RENDER_THRESHOLD = 4
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_INCOMPLETE_CMD_RE = re.compile(r'\\[a-zA-Z]*\{[^}]*$')
+_COMMAND_RE = re.compile(r'\\([a-zA-Z]+)')
+
+# アニメーション用に数式を分割する区切り（同じ位置で一致しうるものは長い方を先に）
+_SPLIT_RE = re.compile(r'(\\cdot|\\times|\\to|=|\+|-)')
+
+# テキスト中の数式を抽出するパターン
+_MATH_PATTERNS = [re.compile(pattern, re.DOTALL) for pattern in (
+    r'\$\$([^$]+)\$\$',  # Display math
+    r'\$([^$]+)\$',      # Inline math
+    r'\\\[([^\]]+)\\\]',  # Display math alternative
+    r'\\\(([^\)]+)\\\)',  # Inline math alternative
+    r'\\begin\{equation\}(.*?)\\end\{equation\}',
+    r'\\begin\{align\}(.*?)\\end\{align\}',
+    r'\\begin\{eqnarray\}(.*?)\\end\{eqnarray\}'
+)]
+
+# 検証で既知とみなすコマンド
+_KNOWN_COMMANDS = frozenset({
+    'frac', 'sqrt', 'sum', 'int', 'prod', 'lim',
+    'sin', 'cos', 'tan', 'log', 'ln', 'exp',
+    'alpha', 'beta', 'gamma', 'delta', 'epsilon',
+    'theta', 'lambda', 'mu', 'pi', 'sigma', 'phi',
+    'left', 'right', 'begin', 'end', 'text',
+    'mathbf', 'mathit', 'mathrm', 'mathcal',
+    'partial', 'nabla', 'infty', 'pm', 'cdot',
+    'times', 'div', 'leq', 'geq', 'neq', 'approx'
+})
+
+# これより長い数式は括弧の数をnumpyで1パスで数える（短いものはstr.countの方が速い）
+_VECTOR_COUNT_THRESHOLD = 4096
+
+def _bracket_balance(expr: str) -> Dict[str, int]:
+    """開き括弧と閉じ括弧の個数の差を括弧の種類ごとに計算"""
+    if len(expr) < _VECTOR_COUNT_THRESHOLD:
+        counts = {ch: expr.count(ch) for ch in '{}()[]'}
+    else:
+        # 括弧はASCIIなので、UTF-8のバイト列で数えても文字数と一致する
+        tally = np.bincount(np.frombuffer(expr.encode('utf-8'), dtype=np.uint8), minlength=256)
+        counts = {ch: int(tally[ord(ch)]) for ch in '{}()[]'}
+    
+    return {
+        'brace': counts['{'] - counts['}'],
+        'paren': counts['('] - counts[')'],
+        'bracket': counts['['] - counts[']']
+    }
+
+@lru_cache(maxsize=16)
+def _load_font(name: str, size: int):
+    """フォントを読み込む（TTFの解析は一度だけ。見つからなければデフォルトフォント）"""
+    try:
+        return ImageFont.truetype(name, size)
+    except OSError:
+        return ImageFont.load_default()
+
+@lru_cache(maxsize=1024)
+def _clean_latex(expr: str) -> str:
+    """ラテックス数式をクリーンアップ（アニメーションでは同じ部分式が繰り返し来るのでメモ化）"""
+    # 不要な空白を除去
+    expr = _WHITESPACE_RE.sub(' ', expr.strip())
+    
+    # ドルマークを除去
+    expr = expr.replace('$', '')
+    
+    # エスケープシーケンスを修正
+    expr = expr.replace('\\\\', '\\\\')
+    
+    return expr
+
 class MathRenderer:
     """数式レンダリングユーティリティ"""
     
@@ -20,6 +109,34 @@ class MathRenderer:
         # 数式レンダリングの設定
         plt.rcParams['mathtext.fontset'] = 'stix'
         plt.rcParams['font.family'] = 'STIXGeneral'
+        
+        # 描画用のFigureは一度だけ作り、テキストだけを差し替えて使い回す
+        # （pyplotを通さないのでFigureは閉じる必要がない。描画状態を共有するのでロックで保護する）
+        self._figure = None
+        self._text = None
+        self._figure_lock = threading.Lock()
+        
+        # 数式の寸法はmathtextで直接求め、ぴったりのサイズのFigureに1回だけ描画する
+        self._parser = MathTextParser('path')
+        
+        # 描画結果を(数式, DPI, フォントサイズ)のハッシュで保存し、同じ数式は描画せずリンクで済ませる
+        self._render_cache_dir = Path(tempfile.gettempdir()) / 'math_render_cache'
+        self._render_cache_dir.mkdir(parents=True, exist_ok=True)
+    
+    def _get_figure(self):
+        """使い回す描画用のFigureとテキストを取得（初回だけ作成）"""
+        if self._figure is None:
+            figure = Figure(figsize=(10, 2))
+            ax = figure.add_subplot()
+            self._text = ax.text(0.5, 0.5, '',
+                                 horizontalalignment='center',
+                                 verticalalignment='center',
+                                 transform=ax.transAxes)
+            ax.set_xlim(0, 1)
+            ax.set_ylim(0, 1)
+            ax.axis('off')
+            self._figure = figure
+        return self._figure, self._text
     
     def render_latex_to_image(self, latex_expr: str, output_path: Path, 
                              dpi: int = 300, font_size: int = 14) -> bool:
@@ -28,46 +145,109 @@ class MathRenderer:
             # 数式をクリーンアップ
             clean_expr = self._clean_latex_expression(latex_expr)
             
-            # matplotlibでレンダリング
-            fig, ax = plt.subplots(figsize=(10, 2))
-            ax.text(0.5, 0.5, f'${clean_expr}$', 
-                   horizontalalignment='center',
-                   verticalalignment='center',
-                   fontsize=font_size,
-                   transform=ax.transAxes)
+            key = hashlib.blake2b(f'{clean_expr}|{dpi}|{font_size}'.encode(), digest_size=16).hexdigest()
+            cached = self._render_cache_dir / f'{key}.png'
             
-            ax.set_xlim(0, 1)
-            ax.set_ylim(0, 1)
-            ax.axis('off')
-            
-            # 余白を最小化
-            plt.tight_layout()
-            plt.savefig(output_path, dpi=dpi, bbox_inches='tight', 
-                       pad_inches=0.1, facecolor='white')
-            plt.close()
+            if not cached.exists():
+                # 書きかけのファイルを他のレンダリングに見せないよう、一時ファイルに描いてから置き換える
+                partial = self._render_cache_dir / f'.{key}.{os.getpid()}.{threading.get_ident()}.png'
+                try:
+                    self._render(clean_expr, partial, dpi, font_size)
+                    os.replace(partial, cached)
+                finally:
+                    partial.unlink(missing_ok=True)
             
+            link_or_copy(cached, Path(output_path))
             return True
             
         except Exception as e:
             logger.error(f"LaTeX rendering error: {e}")
             return False
     
+    def _render(self, clean_expr: str, output_path: Path, dpi: int, font_size: int):
+        """クリーンアップ済みの数式を画像に描画"""
+        try:
+            self._render_mathtext(f'${clean_expr}$', output_path, dpi, font_size)
+            return
+        except Exception as e:
+            logger.debug(f"Mathtext rendering failed, falling back to figure layout: {e}")
+        
+        # matplotlibでレンダリング（余白はbbox_inches='tight'で最小化）
+        with self._figure_lock:
+            fig, text = self._get_figure()
+            text.set_text(f'${clean_expr}$')
+            text.set_fontsize(font_size)
+            fig.savefig(output_path, dpi=dpi, bbox_inches='tight',
+                        pad_inches=0.1, facecolor='white')
+    
+    def _render_mathtext(self, math_text: str, output_path: Path, dpi: int, font_size: int):
+        """mathtextで寸法を求め、余白込みでちょうどの大きさのFigureに描画
+        
+        bbox_inches='tight'のように寸法を測るための描画を別に行わないので、1回の描画で済む
+        """
+        prop = FontProperties(size=font_size)
+        width, height, depth, _, _ = self._parser.parse(math_text, dpi=72, prop=prop)
+        
+        fig_width = width / 72 + 2 * _PAD_INCHES
+        fig_height = height / 72 + 2 * _PAD_INCHES
+        fig = Figure(figsize=(fig_width, fig_height))
+        fig.text(_PAD_INCHES / fig_width, (_PAD_INCHES + depth / 72) / fig_height,
+                 math_text, fontproperties=prop, color='black')
+        fig.savefig(output_path, dpi=dpi, facecolor='white')
+    
     def render_multiple_expressions(self, expressions: List[str], 
                                   output_dir: Path, **kwargs) -> List[str]:
         """複数の数式を一括レンダリング"""
         output_dir.mkdir(parents=True, exist_ok=True)
         rendered_paths = []
         
-        for i, expr in enumerate(expressions):
-            output_path = output_dir / f"math_{i+1:03d}.png"
-            
-            if self.render_latex_to_image(expr, output_path, **kwargs):
+        jobs = [(expr, output_dir / f"math_{i+1:03d}.png") for i, expr in enumerate(expressions)]
+        results = self._render_batch(jobs, **kwargs)
+        
+        for i, ((expr, output_path), success) in enumerate(zip(jobs, results)):
+            if success:
                 rendered_paths.append(str(output_path))
             else:
                 logger.warning(f"Failed to render expression {i+1}: {expr}")
         
         return rendered_paths
     
+    def _render_batch(self, jobs: List[Tuple[str, Path]],
+                      dpi: int = 300, font_size: int = 14) -> List[bool]:
+        """
+        (数式, 出力パス)の一覧を描画し、成否を入力順に返す
+        
+        異なる数式が多いときは、それぞれの最初の出現だけをプロセスプールで並列に描画する。
+        2回目以降の出現は描画キャッシュからリンクするだけなので、この処理内で順に行う
+        """
+        first_index = {}
+        for i, (expr, _) in enumerate(jobs):
+            first_index.setdefault(self._clean_latex_expression(expr), i)
+        
+        results: Dict[int, bool] = {}
+        if process_pool_size() > 1 and len(first_index) >= _PARALLEL_RENDER_THRESHOLD:
+            indices = list(first_index.values())
+            executor = get_process_pool()
+            try:
+                rendered = executor.map(
+                    _render_one,
+                    [jobs[i][0] for i in indices],
+                    [jobs[i][1] for i in indices],
+                    repeat(dpi),
+                    repeat(font_size)
+                )
+                results = dict(zip(indices, rendered))
+            except BrokenProcessPool:
+                # 描画できなかった分は、この後この処理内で順に描画する
+                discard_process_pool(executor)
+                results = {}
+        
+        return [
+            results[i] if i in results
+            else self.render_latex_to_image(expr, output_path, dpi=dpi, font_size=font_size)
+            for i, (expr, output_path) in enumerate(jobs)
+        ]
+    
     def create_equation_slide(self, expressions: List[str], 
                             title: str, output_path: Path,
                             slide_width: int = 1920, slide_height: int = 1080) -> bool:
@@ -77,14 +257,9 @@ class MathRenderer:
             img = Image.new('RGB', (slide_width, slide_height), 'white')
             draw = ImageDraw.Draw(img)
             
-            # フォントの設定を試行
-            try:
-                title_font = ImageFont.truetype("arial.ttf", 48)
-                text_font = ImageFont.truetype("arial.ttf", 24)
-            except OSError:
-                # デフォルトフォントを使用
-                title_font = ImageFont.load_default()
-                text_font = ImageFont.load_default()
+            # フォントの設定
+            title_font = _load_font("arial.ttf", 48)
+            text_font = _load_font("arial.ttf", 24)
             
             # タイトルを描画
             title_bbox = draw.textbbox((0, 0), title, font=title_font)
@@ -122,56 +297,37 @@ class MathRenderer:
     
     def _clean_latex_expression(self, expr: str) -> str:
         """ラテックス数式をクリーンアップ"""
-        # 不要な空白を除去
-        expr = re.sub(r'\s+', ' ', expr.strip())
-        
-        # ドルマークを除去
-        expr = expr.replace('$', '')
-        
-        # エスケープシーケンスを修正
-        expr = expr.replace('\\\\', '\\\\')
-        
-        return expr
+        return _clean_latex(expr)
     
     def validate_latex_syntax(self, expr: str) -> Dict[str, any]:
         """ラテックス数式の文法を検証"""
         errors = []
         warnings = []
         
+        balance = _bracket_balance(expr)
+        
         # ブレースのバランスチェック
-        brace_count = expr.count('{') - expr.count('}')
+        brace_count = balance['brace']
         if brace_count != 0:
             errors.append(f"ブレースのバランスエラー: {brace_count}")
         
         # パレンのバランスチェック
-        paren_count = expr.count('(') - expr.count(')')
+        paren_count = balance['paren']
         if paren_count != 0:
             errors.append(f"括弧のバランスエラー: {paren_count}")
         
         # 角括弧のバランスチェック
-        bracket_count = expr.count('[') - expr.count(']')
+        bracket_count = balance['bracket']
         if bracket_count != 0:
             errors.append(f"角括弧のバランスエラー: {bracket_count}")
         
         # 未完成のコマンドをチェック
-        incomplete_commands = re.findall(r'\\[a-zA-Z]*\{[^}]*$', expr)
+        incomplete_commands = _INCOMPLETE_CMD_RE.findall(expr)
         if incomplete_commands:
             errors.append(f"未完成のコマンド: {incomplete_commands}")
         
         # 未定義コマンドの検出
-        commands = re.findall(r'\\([a-zA-Z]+)', expr)
-        known_commands = {
-            'frac', 'sqrt', 'sum', 'int', 'prod', 'lim',
-            'sin', 'cos', 'tan', 'log', 'ln', 'exp',
-            'alpha', 'beta', 'gamma', 'delta', 'epsilon',
-            'theta', 'lambda', 'mu', 'pi', 'sigma', 'phi',
-            'left', 'right', 'begin', 'end', 'text',
-            'mathbf', 'mathit', 'mathrm', 'mathcal',
-            'partial', 'nabla', 'infty', 'pm', 'cdot',
-            'times', 'div', 'leq', 'geq', 'neq', 'approx'
-        }
-        
-        unknown_commands = set(commands) - known_commands
+        unknown_commands = set(_COMMAND_RE.findall(expr)) - _KNOWN_COMMANDS
         if unknown_commands:
             warnings.append(f"未知のコマンド: {list(unknown_commands)}")
         
@@ -183,23 +339,12 @@ class MathRenderer:
     
     def extract_math_from_text(self, text: str) -> List[str]:
         """テキストから数式を抽出"""
-        patterns = [
-            r'\$\$([^$]+)\$\$',  # Display math
-            r'\$([^$]+)\$',      # Inline math
-            r'\\\[([^\]]+)\\\]',  # Display math alternative
-            r'\\\(([^\)]+)\\\)',  # Inline math alternative
-            r'\\begin\{equation\}(.*?)\\end\{equation\}',
-            r'\\begin\{align\}(.*?)\\end\{align\}',
-            r'\\begin\{eqnarray\}(.*?)\\end\{eqnarray\}'
-        ]
-        
-        math_expressions = []
-        for pattern in patterns:
-            matches = re.findall(pattern, text, re.DOTALL)
-            math_expressions.extend(matches)
+        math_expressions = set()
+        for pattern in _MATH_PATTERNS:
+            math_expressions.update(pattern.findall(text))
         
         # 重複を除去して返す
-        return list(set(math_expressions))
+        return list(math_expressions)
     
     def create_math_animation_frames(self, expr: str, steps: int, 
                                    output_dir: Path) -> List[str]:
@@ -210,14 +355,18 @@ class MathRenderer:
         # 数式を部分ごとに分割
         parts = self._split_expression_into_parts(expr)
         
+        jobs = []
         for i in range(steps):
             # ステップに応じて表示する部分を決定
             visible_parts = parts[:int((i + 1) * len(parts) / steps)]
             partial_expr = ' '.join(visible_parts)
             
-            frame_path = output_dir / f"frame_{i+1:03d}.png"
-            
-            if self.render_latex_to_image(partial_expr, frame_path):
+            jobs.append((partial_expr, output_dir / f"frame_{i+1:03d}.png"))
+        
+        results = self._render_batch(jobs)
+        
+        for i, ((_, frame_path), success) in enumerate(zip(jobs, results)):
+            if success:
                 frame_paths.append(str(frame_path))
             else:
                 logger.warning(f"Failed to render frame {i+1}")
@@ -228,25 +377,11 @@ class MathRenderer:
         """数式をアニメーション用に分割"""
         # 簡単な分割ロジック（実際の実装ではもっと複雑な処理が必要）
         
-        # 等号、演算子で分割
-        separators = ['=', '+', '-', '\\cdot', '\\times', '\\to']
-        
-        parts = [expr]
-        for sep in separators:
-            new_parts = []
-            for part in parts:
-                if sep in part:
-                    split_parts = part.split(sep)
-                    for i, split_part in enumerate(split_parts):
-                        new_parts.append(split_part.strip())
-                        if i < len(split_parts) - 1:
-                            new_parts.append(sep)
-                else:
-                    new_parts.append(part)
-            parts = new_parts
+        # 等号、演算子で1回で分割（区切りはキャプチャグループなので結果に残る）
+        parts = (part.strip() for part in _SPLIT_RE.split(expr))
         
         # 空の部分を除去
-        return [part for part in parts if part.strip()]
+        return [part for part in parts if part]
     
     def test_render_capability(self) -> Dict[str, bool]:
         """レンダリング機能のテスト"""
@@ -267,4 +402,14 @@ class MathRenderer:
                 test_file = temp_path / f"test_{name}.png"
                 results[name] = self.render_latex_to_image(expr, test_file)
         
-        return results
\ No newline at end of file
+        return results
+
+# ワーカープロセスごとのレンダラー（共有プールのワーカーで最初に描画するときに1回だけ作る）
+_worker_renderer: Optional[MathRenderer] = None
+
+def _render_one(expr: str, output_path: Path, dpi: int, font_size: int) -> bool:
+    """ワーカープロセスで数式を1つ描画"""
+    global _worker_renderer
+    if _worker_renderer is None:
+        _worker_renderer = MathRenderer()
+    return _worker_renderer.render_latex_to_image(expr, output_path, dpi=dpi, font_size=font_size)
@@ -1,18 +1,276 @@
+import asyncio
+import hashlib
+import json
 import logging
+import os
+from collections import Counter, OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from itertools import repeat
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
-import PyPDF2
-import pdfplumber
-from PIL import Image
+from typing import Any, Dict, List, Optional, Tuple
+import importlib.util
 import io
 
+# PDFライブラリ（特にpdfplumberが読み込むpdfminer.six）とPIL・numpyは読み込みが重いので、
+# 使う関数の中でインポートし、PDFを扱わないプロセスでは読み込まない
+
+# PyMuPDF（MuPDFのC実装で、pypdfより一桁速い）。AGPLのため必須依存にはせず、インストールされていれば使う
+PYMUPDF_AVAILABLE = importlib.util.find_spec("pymupdf") is not None
+
+from ..config.settings import settings
+from .process_pool import discard_process_pool, get_process_pool, process_pool_size
+
 logger = logging.getLogger(__name__)
 
+# ページ処理をプロセスに分けるときの1タスクあたりのページ数
+_PAGES_PER_TASK = 10
+
+# ページ処理結果をメモリに保持する(PDF, 処理)の数
+_PAGE_CACHE_SIZE = 64
+
+# 繰り返し開くPDFの内容をメモリに保持する合計サイズの上限
+_PDF_BYTES_CACHE_LIMIT = 256 * 1024 * 1024
+
+# hashlib.file_digestが無い環境で使う読み込み単位
+_HASH_BUFSIZE = 1024 * 1024
+
+# これより文字の少ないページ（表紙・図だけのページなど）はカラム解析を省く
+_MIN_COLUMN_CHARS = 20
+
+# 向きの判定結果（横長かどうかの真偽値で引く）
+_ORIENTATIONS = ('portrait', 'landscape')
+
+@lru_cache(maxsize=256)
+def _pdf_fingerprint(path: str, size: int, mtime_ns: int) -> str:
+    """PDFの内容の識別子（全体のSHA-256。パス・サイズ・更新時刻が同じ間は読み直さない）
+
+    ディスクキャッシュは別のセッションからも引かれるので、一部だけでなく内容全体で識別する
+    （ハッシュの計算はpdfplumberの解析に比べれば十分に軽い）
+    """
+    with open(path, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'):
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+        
+        digest = hashlib.sha256()
+        while chunk := f.read(_HASH_BUFSIZE):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+def _pdf_key(pdf_path: Path) -> str:
+    """PDFのキャッシュキー"""
+    stat = os.stat(pdf_path)
+    return _pdf_fingerprint(os.path.realpath(pdf_path), stat.st_size, stat.st_mtime_ns)
+
+def _page_count(pdf_path: Path) -> int:
+    """ページ数を取得（pdfplumberでページを解析せずに数える）"""
+    if PYMUPDF_AVAILABLE:
+        import pymupdf
+        with pymupdf.open(pdf_path) as doc:
+            return doc.page_count
+    
+    import pypdf
+    return len(pypdf.PdfReader(pdf_path).pages)
+
+def _page_text(page) -> Optional[str]:
+    """ページのテキスト"""
+    return page.extract_text()
+
+def _page_tables(page) -> List[List[List[str]]]:
+    """ページの表"""
+    return page.extract_tables()
+
+def _page_columns(page) -> Optional[Dict]:
+    """ページのカラムレイアウト（文字が無ければNone）"""
+    import numpy as np
+    
+    # テキストのX座標を分析
+    chars = page.objects.get('char', ())
+    if not chars:
+        return None
+    if len(chars) < _MIN_COLUMN_CHARS:
+        return {'page': page.page_number, 'columns': [], 'column_count': 0}
+    
+    # X座標でグループ化（重複除去と整列をnumpyでまとめて行う）
+    x_positions = np.unique(np.fromiter((char['x0'] for char in chars), dtype=np.float64, count=len(chars)))
+    
+    # カラムの閾値を決定
+    tolerance = 20  # ピクセル
+    
+    # 隣り合うX座標の間隔が閾値以上の位置でカラムを区切る
+    breaks = np.flatnonzero(np.diff(x_positions) >= tolerance) + 1
+    starts = x_positions[np.concatenate(([0], breaks))]
+    ends = x_positions[np.concatenate((breaks - 1, [len(x_positions) - 1]))]
+    
+    columns = [
+        {'start': float(start), 'end': float(end)}
+        for start, end in zip(starts, ends)
+    ]
+    
+    return {
+        'page': page.page_number,
+        'columns': columns,
+        'column_count': len(columns)
+    }
+
+def _page_fonts(page) -> Optional[Dict]:
+    """ページのフォント情報（文字が無ければNone）"""
+    chars = page.objects.get('char', ())
+    if not chars:
+        return None
+    
+    # (フォント名, サイズ)ごとの文字数を集計（初出順）
+    counts = Counter((char.get('fontname', 'Unknown'), char.get('size', 0)) for char in chars)
+    
+    return {
+        'page': page.page_number,
+        'fonts': [
+            {'name': font_name, 'size': font_size, 'count': count}
+            for (font_name, font_size), count in counts.items()
+        ]
+    }
+
+def _page_all(page) -> Dict:
+    """ページのテキスト・表・カラム・フォント・寸法を1回の解析でまとめて取得"""
+    width, height = float(page.width), float(page.height)
+    return {
+        'text': _page_text(page),
+        'tables': _page_tables(page),
+        'columns': _page_columns(page),
+        'fonts': _page_fonts(page),
+        'dimensions': {
+            'page': page.page_number,
+            'width': width,
+            'height': height,
+            'orientation': _ORIENTATIONS[width > height]
+        },
+        'char_count': len(page.objects.get('char', ()))
+    }
+
+_PAGE_OPS = {
+    'text': _page_text,
+    'tables': _page_tables,
+    'columns': _page_columns,
+    'fonts': _page_fonts,
+    'all': _page_all
+}
+
+def _split_page_range(pdf_path: Path, page_indices: List[int], output_dir: Path) -> List[str]:
+    """
+    指定ページ（0始まり）をそれぞれ1ページのPDFとして書き出す
+    
+    ワーカープロセスで実行できるようモジュールレベルに置く
+    """
+    output_paths = []
+    
+    if PYMUPDF_AVAILABLE:
+        import pymupdf
+        with pymupdf.open(pdf_path) as src:
+            for page_num in page_indices:
+                output_path = output_dir / f"page_{page_num+1:03d}.pdf"
+                
+                with pymupdf.open() as single:
+                    single.insert_pdf(src, from_page=page_num, to_page=page_num)
+                    single.save(output_path)
+                
+                output_paths.append(str(output_path))
+        return output_paths
+    
+    import pypdf
+    with open(pdf_path, 'rb') as file:
+        reader = pypdf.PdfReader(file)
+        
+        for page_num in page_indices:
+            writer = pypdf.PdfWriter()
+            writer.add_page(reader.pages[page_num])
+            
+            output_path = output_dir / f"page_{page_num+1:03d}.pdf"
+            
+            with open(output_path, 'wb') as output_file:
+                writer.write(output_file)
+            
+            output_paths.append(str(output_path))
+    return output_paths
+
+def _save_image(output_dir: Path, name: str, ext: str, data: bytes, as_png: bool) -> str:
+    """符号化済みの画像データを書き出す（as_pngでPNG以外のときだけPILで変換する）"""
+    if as_png and ext != 'png':
+        from PIL import Image
+        
+        img_path = output_dir / f"{name}.png"
+        Image.open(io.BytesIO(data)).save(img_path, 'PNG')
+    else:
+        img_path = output_dir / f"{name}.{ext}"
+        img_path.write_bytes(data)
+    return str(img_path)
+
+def _join_page_texts(page_texts) -> str:
+    """ページごとのテキストを改行区切りで連結（テキストの無いページは飛ばす）"""
+    parts: List[str] = []
+    for page_text in page_texts:
+        if page_text:
+            parts.append(page_text)
+            parts.append("\n")
+    return "".join(parts)
+
+def _process_page_range(pdf_path: Path, page_numbers: Optional[List[int]], op: str) -> List[Any]:
+    """
+    指定ページ（1始まり、Noneなら全ページ）にページ単位の処理を適用
+    
+    ワーカープロセスで実行できるようモジュールレベルに置く
+    """
+    import pdfplumber
+    
+    handler = _PAGE_OPS[op]
+    results = []
+    with pdfplumber.open(pdf_path, pages=page_numbers) as pdf:
+        for page in pdf.pages:
+            results.append(handler(page))
+            # 解析済みのレイアウトオブジェクトをすぐ解放する（pdfplumber 0.11以降はclose、それ以前はflush_cache）
+            getattr(page, 'close', page.flush_cache)()
+    return results
+
 class PDFProcessor:
     """ピーディーエフ処理ユーティリティ"""
     
     def __init__(self):
         self.supported_formats = ['.pdf']
+        # (PDFの識別子, 処理) -> ページ順の処理結果。同じPDFに対する抽出でページを解析し直さない
+        self._page_cache: "OrderedDict[Tuple[str, str], List[Any]]" = OrderedDict()
+        # (パス, サイズ, 更新時刻) -> ファイルの内容。同じPDFを開き直すたびにファイルを細かく読み直さない
+        self._pdf_bytes_cache: "OrderedDict[Tuple[str, int, int], bytes]" = OrderedDict()
+    
+    def _pdf_bytes(self, pdf_path: Path) -> bytes:
+        """
+        PDFの内容を取得（一括で読み込み、変更されるまで使い回す）
+        
+        mmapは読み取り位置を共有してしまい、同じPDFを同時に読むリーダー間で使い回せないため、
+        不変のbytesを保持して使うたびに独立したストリームを作る
+        """
+        stat = os.stat(pdf_path)
+        key = (os.path.realpath(pdf_path), stat.st_size, stat.st_mtime_ns)
+        data = self._pdf_bytes_cache.get(key)
+        if data is not None:
+            self._pdf_bytes_cache.move_to_end(key)
+            return data
+        
+        data = Path(pdf_path).read_bytes()
+        self._pdf_bytes_cache[key] = data
+        total = sum(len(cached) for cached in self._pdf_bytes_cache.values())
+        while total > _PDF_BYTES_CACHE_LIMIT and len(self._pdf_bytes_cache) > 1:
+            _, evicted = self._pdf_bytes_cache.popitem(last=False)
+            total -= len(evicted)
+        return data
+    
+    def _open_pdf(self, pdf_path: Path) -> io.BytesIO:
+        """pypdf用のストリーム（BytesIOは元のbytesを複製せずに参照する）"""
+        return io.BytesIO(self._pdf_bytes(pdf_path))
+    
+    def _open_document(self, pdf_path: Path):
+        """PyMuPDFのドキュメントをメモリ上の内容から開く"""
+        import pymupdf
+        
+        return pymupdf.open(stream=self._pdf_bytes(pdf_path), filetype='pdf')
     
     def extract_metadata(self, pdf_path: Path) -> Dict:
         """メタデータを抽出"""
@@ -28,8 +286,26 @@ class PDFProcessor:
         }
         
         try:
-            with open(pdf_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
+            if PYMUPDF_AVAILABLE:
+                with self._open_document(pdf_path) as doc:
+                    metadata['pages'] = doc.page_count
+                    
+                    info = doc.metadata or {}
+                    metadata.update({
+                        'title': info.get('title') or '',
+                        'author': info.get('author') or '',
+                        'subject': info.get('subject') or '',
+                        'creator': info.get('creator') or '',
+                        'producer': info.get('producer') or '',
+                        'creation_date': info.get('creationDate') or None,
+                        'modification_date': info.get('modDate') or None
+                    })
+                return metadata
+            
+            import pypdf
+            
+            with self._open_pdf(pdf_path) as file:
+                reader = pypdf.PdfReader(file)
                 metadata['pages'] = len(reader.pages)
                 
                 if reader.metadata:
@@ -48,49 +324,188 @@ class PDFProcessor:
             
         return metadata
     
+    def _map_pages(self, pdf_path: Path, op: str) -> List[Any]:
+        """
+        全ページにページ単位の処理を適用し、ページ順に結果を返す
+        
+        結果はPDFの内容ごとにメモリとディスク（settings.pdf_cache_dir）にキャッシュし、
+        同じPDFへの2回目以降の抽出ではページを解析しない。返すリストはキャッシュと共有するので変更しないこと
+        """
+        key = _pdf_key(pdf_path)
+        results = self._lookup_page_results(key, op)
+        if results is not None:
+            return results
+        
+        # extract_allで全項目をまとめて抽出済みなら、そこから取り出す
+        if op != 'all':
+            bundle = self._lookup_page_results(key, 'all')
+            if bundle is not None:
+                return [page_results[op] for page_results in bundle]
+        
+        results = self._process_pages(pdf_path, op)
+        self._save_page_results(self._page_cache_path(key, op), results)
+        self._remember_page_results(key, op, results)
+        return results
+    
+    def _page_cache_path(self, key: str, op: str) -> Path:
+        """ページ処理結果のディスクキャッシュのパス"""
+        return Path(settings.pdf_cache_dir) / key / f"{op}.json"
+    
+    def _lookup_page_results(self, key: str, op: str) -> Optional[List[Any]]:
+        """キャッシュ済みのページ処理結果（メモリ、ディスクの順に探す。無ければNone）"""
+        cached = self._page_cache.get((key, op))
+        if cached is not None:
+            self._page_cache.move_to_end((key, op))
+            return cached
+        
+        try:
+            results = json.loads(self._page_cache_path(key, op).read_bytes())
+        except (OSError, ValueError):
+            return None
+        
+        self._remember_page_results(key, op, results)
+        return results
+    
+    def _remember_page_results(self, key: str, op: str, results: List[Any]) -> None:
+        """ページ処理結果をメモリに保持（古いものから捨てる）"""
+        self._page_cache[(key, op)] = results
+        self._page_cache.move_to_end((key, op))
+        while len(self._page_cache) > _PAGE_CACHE_SIZE:
+            self._page_cache.popitem(last=False)
+    
+    def _save_page_results(self, cache_path: Path, results: List[Any]) -> None:
+        """ページ処理結果をディスクキャッシュに保存（失敗しても処理は続ける）"""
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            partial = cache_path.with_name(f".{cache_path.name}.{os.getpid()}")
+            partial.write_text(json.dumps(results, ensure_ascii=False), encoding='utf-8')
+            os.replace(partial, cache_path)
+        except OSError as e:
+            logger.warning(f"Failed to write PDF page cache {cache_path}: {e}")
+    
+    def _process_pages(self, pdf_path: Path, op: str) -> List[Any]:
+        """
+        全ページをpdfplumberで処理
+        
+        ページ数が多ければ、ページ範囲ごとにプロセスを分けて並列に処理する
+        （各プロセスがPDFを開き直すので、渡すのはパスとページ番号だけ）
+        """
+        page_count = _page_count(pdf_path)
+        chunks = [
+            list(range(start + 1, min(start + _PAGES_PER_TASK, page_count) + 1))
+            for start in range(0, page_count, _PAGES_PER_TASK)
+        ]
+        
+        # 全ページを一度に開かず、ページ範囲ごとに開いて閉じる（長いPDFでもメモリを抑える）
+        if len(chunks) <= 1 or process_pool_size() <= 1:
+            return [result for chunk in chunks for result in _process_page_range(pdf_path, chunk, op)]
+        
+        executor = get_process_pool()
+        try:
+            results = executor.map(_process_page_range, repeat(pdf_path), chunks, repeat(op))
+            return [result for chunk_results in results for result in chunk_results]
+        except BrokenProcessPool:
+            discard_process_pool(executor)
+            raise
+    
+    def extract_all(self, pdf_path: Path) -> Dict:
+        """
+        テキスト・表・カラム・フォント・寸法を1回のページ走査でまとめて抽出
+        
+        複数の情報が必要な場合、個別のメソッドを呼ぶとページをその回数だけ解析することになる。
+        この結果はキャッシュされ、以降の個別メソッド（extract_textなど）もここから取り出す
+        """
+        result = {
+            'text': '',
+            'tables': [],
+            'columns': [],
+            'fonts': [],
+            'dimensions': [],
+            'char_count': 0
+        }
+        
+        try:
+            pages = self._map_pages(pdf_path, 'all')
+            result.update({
+                'text': _join_page_texts(page['text'] for page in pages),
+                'tables': [table for page in pages if page['tables'] for table in page['tables']],
+                'columns': [page['columns'] for page in pages if page['columns'] is not None],
+                'fonts': [page['fonts'] for page in pages if page['fonts'] is not None],
+                'dimensions': [page['dimensions'] for page in pages],
+                'char_count': sum(page['char_count'] for page in pages)
+            })
+            
+        except Exception as e:
+            logger.error(f"PDF extraction error: {e}")
+            
+        return result
+    
     def extract_text(self, pdf_path: Path) -> str:
         """テキストを抽出"""
         text = ""
         
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-                        
+            text = _join_page_texts(self._map_pages(pdf_path, 'text'))
+                    
         except Exception as e:
             logger.error(f"PDF text extraction error: {e}")
             
         return text
     
-    def extract_images(self, pdf_path: Path, output_dir: Path) -> List[str]:
-        """画像を抽出"""
+    async def extract_text_async(self, pdf_path: Path) -> str:
+        """
+        テキストを抽出（非同期版）
+        
+        ページの解析はスレッドに逃がし、その間イベントループを止めない。
+        ページごとの並列化は_process_pagesのプロセスプールが受け持つ
+        """
+        return await asyncio.to_thread(self.extract_text, pdf_path)
+    
+    def extract_images(self, pdf_path: Path, output_dir: Path, as_png: bool = False) -> List[str]:
+        """
+        画像を抽出
+        
+        画像は埋め込まれている形式（JPEGならJPEG）のまま再エンコードせずに書き出す。
+        as_png=Trueなら、PNG以外の画像をPILでPNGに変換して揃える
+        """
         output_dir.mkdir(parents=True, exist_ok=True)
         image_paths = []
         
         try:
-            with open(pdf_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
+            if PYMUPDF_AVAILABLE:
+                with self._open_document(pdf_path) as doc:
+                    for page_num in range(doc.page_count):
+                        for image in doc.get_page_images(page_num):
+                            xref = image[0]
+                            try:
+                                # 埋め込まれた画像の符号化済みデータをそのまま取り出す
+                                info = doc.extract_image(xref)
+                                image_paths.append(_save_image(
+                                    output_dir, f"page_{page_num+1}_img_{xref}",
+                                    info['ext'], info['image'], as_png
+                                ))
+                                
+                            except Exception as e:
+                                logger.warning(f"Image extraction failed for {xref}: {e}")
+                return image_paths
+            
+            import pypdf
+            
+            with self._open_pdf(pdf_path) as file:
+                reader = pypdf.PdfReader(file)
                 
                 for page_num, page in enumerate(reader.pages):
-                    if '/XObject' in page['/Resources']:
-                        xObject = page['/Resources']['/XObject'].get_object()
-                        
-                        for obj in xObject:
-                            if xObject[obj]['/Subtype'] == '/Image':
-                                try:
-                                    # 画像データを抽出
-                                    img_data = xObject[obj]._data
-                                    img = Image.open(io.BytesIO(img_data))
-                                    
-                                    # 画像を保存
-                                    img_path = output_dir / f"page_{page_num+1}_img_{obj}.png"
-                                    img.save(img_path, 'PNG')
-                                    image_paths.append(str(img_path))
-                                    
-                                except Exception as e:
-                                    logger.warning(f"Image extraction failed for {obj}: {e}")
+                    # page.imagesはフィルターを解いた符号化済みデータを返す（_dataは生のストリーム）
+                    for image_file in page.images:
+                        name = Path(image_file.name)
+                        try:
+                            image_paths.append(_save_image(
+                                output_dir, f"page_{page_num+1}_img_{name.stem}",
+                                name.suffix.lstrip('.'), image_file.data, as_png
+                            ))
+                            
+                        except Exception as e:
+                            logger.warning(f"Image extraction failed for {name}: {e}")
                                     
         except Exception as e:
             logger.error(f"PDF image extraction error: {e}")
@@ -102,12 +517,10 @@ class PDFProcessor:
         tables = []
         
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
-                    page_tables = page.extract_tables()
-                    if page_tables:
-                        tables.extend(page_tables)
-                        
+            for page_tables in self._map_pages(pdf_path, 'tables'):
+                if page_tables:
+                    tables.extend(page_tables)
+                    
         except Exception as e:
             logger.error(f"PDF table extraction error: {e}")
             
@@ -118,43 +531,8 @@ class PDFProcessor:
         column_info = []
         
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                for page_num, page in enumerate(pdf.pages):
-                    # テキストのX座標を分析
-                    chars = page.chars
-                    if not chars:
-                        continue
-                    
-                    # X座標でグループ化
-                    x_positions = sorted(set(char['x0'] for char in chars))
-                    
-                    # カラムの閾値を決定
-                    tolerance = 20  # ピクセル
-                    columns = []
-                    current_column = [x_positions[0]]
-                    
-                    for x in x_positions[1:]:
-                        if x - current_column[-1] < tolerance:
-                            current_column.append(x)
-                        else:
-                            columns.append({
-                                'start': min(current_column),
-                                'end': max(current_column)
-                            })
-                            current_column = [x]
-                    
-                    if current_column:
-                        columns.append({
-                            'start': min(current_column),
-                            'end': max(current_column)
-                        })
-                    
-                    column_info.append({
-                        'page': page_num + 1,
-                        'columns': columns,
-                        'column_count': len(columns)
-                    })
-                    
+            column_info = [info for info in self._map_pages(pdf_path, 'columns') if info is not None]
+            
         except Exception as e:
             logger.error(f"PDF column detection error: {e}")
             
@@ -165,35 +543,8 @@ class PDFProcessor:
         font_info = []
         
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                for page_num, page in enumerate(pdf.pages):
-                    chars = page.chars
-                    if not chars:
-                        continue
-                    
-                    # フォント情報を集計
-                    fonts = {}
-                    for char in chars:
-                        font_name = char.get('fontname', 'Unknown')
-                        font_size = char.get('size', 0)
-                        font_key = f"{font_name}_{font_size}"
-                        
-                        if font_key not in fonts:
-                            fonts[font_key] = {
-                                'name': font_name,
-                                'size': font_size,
-                                'count': 0,
-                                'chars': []
-                            }
-                        
-                        fonts[font_key]['count'] += 1
-                        fonts[font_key]['chars'].append(char['text'])
-                    
-                    font_info.append({
-                        'page': page_num + 1,
-                        'fonts': list(fonts.values())
-                    })
-                    
+            font_info = [info for info in self._map_pages(pdf_path, 'fonts') if info is not None]
+            
         except Exception as e:
             logger.error(f"PDF font extraction error: {e}")
             
@@ -205,19 +556,23 @@ class PDFProcessor:
         split_files = []
         
         try:
-            with open(pdf_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                
-                for page_num, page in enumerate(reader.pages):
-                    writer = PyPDF2.PdfWriter()
-                    writer.add_page(page)
-                    
-                    output_path = output_dir / f"page_{page_num+1:03d}.pdf"
-                    
-                    with open(output_path, 'wb') as output_file:
-                        writer.write(output_file)
-                    
-                    split_files.append(str(output_path))
+            page_count = _page_count(pdf_path)
+            chunks = [
+                list(range(start, min(start + _PAGES_PER_TASK, page_count)))
+                for start in range(0, page_count, _PAGES_PER_TASK)
+            ]
+            
+            # ページ範囲ごとにプロセスを分けて書き出す（PyMuPDFもpypdfもスレッドでは並列にならない）
+            if len(chunks) <= 1 or process_pool_size() <= 1:
+                split_files = _split_page_range(pdf_path, list(range(page_count)), output_dir)
+            else:
+                executor = get_process_pool()
+                try:
+                    results = executor.map(_split_page_range, repeat(pdf_path), chunks, repeat(output_dir))
+                    split_files = [path for chunk_paths in results for path in chunk_paths]
+                except BrokenProcessPool:
+                    discard_process_pool(executor)
+                    raise
                     
         except Exception as e:
             logger.error(f"PDF splitting error: {e}")
@@ -227,11 +582,21 @@ class PDFProcessor:
     def merge_pdfs(self, pdf_paths: List[Path], output_path: Path) -> bool:
         """複数のPDFを結合"""
         try:
-            writer = PyPDF2.PdfWriter()
+            if PYMUPDF_AVAILABLE:
+                import pymupdf
+                with pymupdf.open() as merged:
+                    for pdf_path in pdf_paths:
+                        with self._open_document(pdf_path) as src:
+                            merged.insert_pdf(src)
+                    merged.save(output_path)
+                return True
+            
+            import pypdf
+            writer = pypdf.PdfWriter()
             
             for pdf_path in pdf_paths:
-                with open(pdf_path, 'rb') as file:
-                    reader = PyPDF2.PdfReader(file)
+                with self._open_pdf(pdf_path) as file:
+                    reader = pypdf.PdfReader(file)
                     for page in reader.pages:
                         writer.add_page(page)
             
@@ -249,26 +614,39 @@ class PDFProcessor:
         bookmarks = []
         
         try:
-            with open(pdf_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                
-                def extract_outline(outline, level=0):
-                    for item in outline:
-                        if isinstance(item, list):
-                            extract_outline(item, level + 1)
-                        else:
-                            page_num = None
-                            if hasattr(item, 'page') and item.page:
-                                page_num = reader.pages.index(item.page.get_object()) + 1
-                            
-                            bookmarks.append({
-                                'title': item.title,
-                                'level': level,
-                                'page': page_num
-                            })
+            if PYMUPDF_AVAILABLE:
+                # 目次は[階層(1始まり), タイトル, ページ番号(1始まり、無ければ-1)]の一覧で得られる
+                with self._open_document(pdf_path) as doc:
+                    for level, title, page_num in doc.get_toc(simple=True):
+                        bookmarks.append({
+                            'title': title,
+                            'level': level - 1,
+                            'page': page_num if page_num > 0 else None
+                        })
+                return bookmarks
+            
+            import pypdf
+            
+            with self._open_pdf(pdf_path) as file:
+                reader = pypdf.PdfReader(file)
                 
-                if reader.outline:
-                    extract_outline(reader.outline)
+                # 入れ子のリスト（子の階層）を再帰せず、イテレーターのスタックで順にたどる
+                stack = [iter(reader.outline)]
+                while stack:
+                    item = next(stack[-1], None)
+                    if item is None:
+                        stack.pop()
+                    elif isinstance(item, list):
+                        stack.append(iter(item))
+                    else:
+                        # ページのオブジェクト番号からページ番号への対応表は、pypdfが初回に一度だけ作る
+                        page_num = reader.get_destination_page_number(item) + 1 or None
+                        
+                        bookmarks.append({
+                            'title': item.title,
+                            'level': len(stack) - 1,
+                            'page': page_num
+                        })
                     
         except Exception as e:
             logger.error(f"PDF bookmark extraction error: {e}")
@@ -280,16 +658,32 @@ class PDFProcessor:
         dimensions = []
         
         try:
-            with open(pdf_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
+            if PYMUPDF_AVAILABLE:
+                with self._open_document(pdf_path) as doc:
+                    for page_num, page in enumerate(doc):
+                        width, height = page.mediabox_size
+                        dimensions.append({
+                            'page': page_num + 1,
+                            'width': width,
+                            'height': height,
+                            'orientation': _ORIENTATIONS[width > height]
+                        })
+                return dimensions
+            
+            import pypdf
+            
+            with self._open_pdf(pdf_path) as file:
+                reader = pypdf.PdfReader(file)
                 
                 for page_num, page in enumerate(reader.pages):
+                    # width/heightは参照のたびに座標の差を計算し直すので、一度だけfloatにする
                     mediabox = page.mediabox
+                    width, height = float(mediabox.width), float(mediabox.height)
                     dimensions.append({
                         'page': page_num + 1,
-                        'width': float(mediabox.width),
-                        'height': float(mediabox.height),
-                        'orientation': 'landscape' if mediabox.width > mediabox.height else 'portrait'
+                        'width': width,
+                        'height': height,
+                        'orientation': _ORIENTATIONS[width > height]
                     })
                     
         except Exception as e:
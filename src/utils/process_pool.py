@@ -0,0 +1,41 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from ..config.settings import settings
+
+# PDF解析・数式描画で共有するプロセスプール（最初に使うときに一度だけ作る）
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def process_pool_size() -> int:
+    """共有プロセスプールのプロセス数（設定が無ければCPUコア数）"""
+    return max(1, settings.process_workers or os.cpu_count() or 1)
+
+def _mp_context():
+    """ワーカーの起動方式
+
+    Webワーカーはスレッドを多数抱えているので、そのままforkせず、
+    使えればforkserver（単一スレッドのサーバープロセスからfork）を使う
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context()
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """共有プロセスプールを取得（初回だけ作成）"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=process_pool_size(), mp_context=_mp_context())
+        return _pool
+
+def discard_process_pool(pool: ProcessPoolExecutor) -> None:
+    """壊れたプール（ワーカーが異常終了したもの）を捨て、次のget_process_poolで作り直させる"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,33 @@
+import asyncio
+from typing import Any, Dict
+
+from celery import Celery
+
+from .config.settings import settings
+
+# 動画生成はWebワーカーとは別プロセスのCeleryワーカーで実行する
+# 起動: celery -A src.worker worker --loglevel=info
+celery_app = Celery(
+    "math_video_generator",
+    broker=settings.redis_url,
+    backend=settings.redis_url
+)
+
+celery_app.conf.update(
+    task_serializer="json",
+    accept_content=["json"],
+    result_serializer="json",
+    worker_concurrency=settings.max_workers,
+    # 数分かかるジョブなので先読みせず、完了後にackして途中終了時は再配送させる
+    worker_prefetch_multiplier=1,
+    task_acks_late=True,
+    task_time_limit=settings.processing_timeout
+)
+
+@celery_app.task(name="render_job")
+def render_job(job_id: str, config: Dict[str, Any]) -> None:
+    """スライド・音声・動画の生成ジョブを実行"""
+    # ルーター側がこのモジュールをインポートするため、循環を避けて遅延インポートする
+    from .api.routes.process import ProcessingConfig, process_document_to_video
+
+    asyncio.run(process_document_to_video(job_id, ProcessingConfig(**config)))
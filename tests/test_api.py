@@ -9,8 +9,10 @@ from src.main import app
 class TestAPI:
     """API エンドポイントのテストクラス"""
     
-    def setup_method(self):
-        self.client = TestClient(app)
+    @classmethod
+    def setup_class(cls):
+        # TestClientはステートレスなので、テストごとに作り直さずクラスで共有する
+        cls.client = TestClient(app)
     
     def test_health_check(self):
         """ヘルスチェックエンドポイントをテスト"""
@@ -81,7 +83,22 @@ class TestAPI:
         assert response.status_code == 413
         assert "File too large" in response.json()["detail"]
     
-    def test_start_processing(self):
+    def test_save_upload_too_large_streamed(self, tmp_path):
+        """申告サイズに関係なく、保存時の実バイト数で上限を検証することをテスト"""
+        from io import BytesIO
+        from fastapi import HTTPException
+        from src.api.routes.upload import _save_upload
+        
+        file_path = tmp_path / "large.pdf"
+        with patch('src.api.routes.upload.settings.max_file_size', 10):
+            with pytest.raises(HTTPException) as exc_info:
+                _save_upload(BytesIO(b"x" * 11), file_path)
+        
+        assert exc_info.value.status_code == 413
+        assert not file_path.exists()
+    
+    @patch('src.api.routes.process.render_job')
+    def test_start_processing(self, mock_render_job):
         """処理開始エンドポイントをテスト"""
         job_id = "test-job-123"
         config = {
@@ -100,6 +117,7 @@ class TestAPI:
         assert data["job_id"] == job_id
         assert data["status"] == "processing_started"
         assert "config" in data
+        mock_render_job.delay.assert_called_once_with(job_id, config)
     
     def test_get_processing_status(self):
         """処理状況確認エンドポイントをテスト"""
@@ -135,6 +153,21 @@ class TestAPI:
         
         assert response.status_code == 404
         assert "Video not found" in response.json()["detail"]
+    
+    def test_download_video_offloaded_to_proxy(self, tmp_path):
+        """X-Accel-Redirect設定時は本文を返さずプロキシに委譲することをテスト"""
+        job_id = "test-job-123"
+        (tmp_path / f"{job_id}.mp4").write_bytes(b"video")
+        
+        with patch('src.api.routes.download.OUTPUT_DIR', tmp_path), \
+             patch('src.api.routes.download.settings.download_offload_header', 'X-Accel-Redirect'), \
+             patch('src.api.routes.download.settings.download_offload_prefix', '/protected/outputs/'):
+            response = self.client.get(f"/api/download/{job_id}/video")
+        
+        assert response.status_code == 200
+        assert response.headers["x-accel-redirect"] == f"/protected/outputs/{job_id}.mp4"
+        assert response.headers["content-type"] == "video/mp4"
+        assert response.content == b""
 
 def mock_open_func(content):
     """ファイルオープンのモック関数"""
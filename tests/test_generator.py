@@ -1,3 +1,5 @@
+import os
+import shutil
 import pytest
 from unittest.mock import Mock, patch, AsyncMock
 from pathlib import Path
@@ -49,6 +51,145 @@ class TestSlideGenerator:
             assert result is not None
             mock_get_data.assert_called_once_with('test_job_id')
             mock_compile.assert_called_once()
+    
+    @pytest.mark.asyncio
+    @patch('src.core.slide_generator.SlideGenerator._get_document_data')
+    @patch('src.core.slide_generator.SlideGenerator._compile_latex')
+    async def test_generate_slides_cache_hit(self, mock_compile, mock_get_data, tmp_path):
+        """同じ内容のスライドはキャッシュから返し、コンパイルしないことをテスト"""
+        from src.core.slide_generator import _PDF_CACHE_DIRNAME, _pdf_cache_key
+        
+        document_data = {'title': 'テスト文書', 'chapters': []}
+        mock_get_data.return_value = document_data
+        
+        cache_dir = tmp_path / _PDF_CACHE_DIRNAME
+        cache_dir.mkdir()
+        (cache_dir / f"{_pdf_cache_key('academic', document_data)}.pdf").write_bytes(b"%PDF")
+        
+        with patch('src.core.slide_generator.settings.output_dir', str(tmp_path)):
+            result = await self.generator.generate_slides('test_job_id')
+        
+        assert Path(result).read_bytes() == b"%PDF"
+        mock_compile.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_compile_latex_draftmode_pass(self, tmp_path):
+        """draftmodeで.auxを確定させ、本番パスは.auxが安定したら1回で終わることをテスト"""
+        tex_path = tmp_path / "job_slides.tex"
+        pdf_path = tmp_path / "out.pdf"
+        
+        async def fake_pdflatex(path, *options):
+            path.with_suffix('.aux').write_text('\\@writefile{toc}{}')
+            if '-draftmode' not in options:
+                path.with_suffix('.pdf').write_bytes(b"%PDF")
+        
+        with patch.object(self.generator, '_run_pdflatex', side_effect=fake_pdflatex) as mock_run:
+            await self.generator._compile_latex(tex_path, pdf_path)
+        
+        assert [call.args[1:] for call in mock_run.call_args_list] == [('-draftmode',), ()]
+        assert pdf_path.read_bytes() == b"%PDF"
+    
+    @staticmethod
+    async def _fake_pdflatex_with_toc(path, *options):
+        """目次を持つ文書のpdflatexの模擬（開始時にあった.tocを読み、終了時に.aux/.toc/.navを書く）"""
+        toc_path = path.with_suffix('.toc')
+        toc = toc_path.read_text() if toc_path.exists() else ''
+        path.with_suffix('.aux').write_text('\\relax')
+        toc_path.write_text('\\beamer@sectionintoc{1}{Intro}')
+        path.with_suffix('.nav').write_text('\\headcommand{}')
+        if '-draftmode' not in options:
+            path.with_suffix('.pdf').write_bytes(b"%PDF " + (b"toc" if toc else b"empty toc"))
+    
+    @pytest.mark.asyncio
+    async def test_compile_latex_reuses_previous_aux(self, tmp_path):
+        """補助ファイル一式を持ち越した再ビルドは1パスで終わり、目次も入ることをテスト"""
+        aux_cache = tmp_path / "aux" / "job_slides"
+        
+        with patch.object(self.generator, '_run_pdflatex', side_effect=self._fake_pdflatex_with_toc) as mock_run:
+            for build in ("first", "second"):
+                work_dir = tmp_path / build
+                work_dir.mkdir()
+                await self.generator._compile_latex(work_dir / "job_slides.tex", tmp_path / f"{build}.pdf",
+                                                    aux_cache=aux_cache)
+        
+        assert [call.args[1:] for call in mock_run.call_args_list] == [('-draftmode',), (), ()]
+        assert (tmp_path / "first.pdf").read_bytes() == b"%PDF toc"
+        assert (tmp_path / "second.pdf").read_bytes() == b"%PDF toc"
+        assert sorted(p.name for p in aux_cache.iterdir()) == ['job_slides.aux', 'job_slides.nav', 'job_slides.toc']
+    
+    @pytest.mark.asyncio
+    async def test_compile_latex_aux_without_toc_reruns(self, tmp_path):
+        """.auxだけが残っていても、.tocを読んだパスが済むまで打ち切らないことをテスト"""
+        aux_cache = tmp_path / "aux" / "job_slides"
+        aux_cache.mkdir(parents=True)
+        (aux_cache / "job_slides.aux").write_text('\\relax')
+        work_dir = tmp_path / "work"
+        work_dir.mkdir()
+        
+        with patch.object(self.generator, '_run_pdflatex', side_effect=self._fake_pdflatex_with_toc) as mock_run:
+            await self.generator._compile_latex(work_dir / "job_slides.tex", tmp_path / "out.pdf",
+                                                aux_cache=aux_cache)
+        
+        assert [call.args[1:] for call in mock_run.call_args_list] == [(), ()]
+        assert (tmp_path / "out.pdf").read_bytes() == b"%PDF toc"
+    
+    @pytest.mark.asyncio
+    async def test_compile_latex_keeps_linked_cache(self, tmp_path):
+        """出力先がキャッシュとハードリンクしていても、キャッシュの中身を書き換えないことをテスト"""
+        work_dir = tmp_path / "work"
+        work_dir.mkdir()
+        tex_path = work_dir / "job_slides.tex"
+        pdf_path = tmp_path / "out.pdf"
+        cache_path = tmp_path / "cache.pdf"
+        cache_path.write_bytes(b"%PDF old")
+        os.link(cache_path, pdf_path)
+        
+        async def fake_pdflatex(path, *options):
+            path.with_suffix('.aux').write_text('')
+            path.with_suffix('.pdf').write_bytes(b"%PDF new")
+        
+        def cross_device_move(src, dst):
+            # tmpfsから出力先への移動はrenameできず、コピーになる
+            shutil.copy2(src, dst)
+            os.unlink(src)
+        
+        with patch.object(self.generator, '_run_pdflatex', side_effect=fake_pdflatex), \
+             patch('src.core.slide_generator.shutil.move', side_effect=cross_device_move):
+            await self.generator._compile_latex(tex_path, pdf_path)
+        
+        assert pdf_path.read_bytes() == b"%PDF new"
+        assert cache_path.read_bytes() == b"%PDF old"
+    
+    @pytest.mark.asyncio
+    async def test_ensure_format_dumped_once(self, tmp_path):
+        """プリアンブルのフォーマットは一度だけダンプされ、以後は再利用されることをテスト"""
+        async def fake_pdflatex(path, *options):
+            jobname = next(o for o in options if o.startswith('-jobname=')).split('=', 1)[1]
+            path.with_name(f"{jobname}.fmt").write_bytes(b"fmt")
+        
+        preamble = '\\documentclass{beamer}\n\\usepackage{amsmath}\n'
+        with patch('src.core.slide_generator.settings.temp_dir', str(tmp_path)), \
+             patch.object(self.generator, '_run_pdflatex', side_effect=fake_pdflatex) as mock_run:
+            first = await self.generator._ensure_format(preamble)
+            second = await self.generator._ensure_format(preamble)
+        
+        assert first == second
+        assert mock_run.call_count == 1
+        assert [p.name for p in (tmp_path / 'latex_formats').iterdir()] == [f"{first}.fmt"]
+
+@pytest.mark.asyncio
+async def test_get_document_memoized():
+    """スライド生成と音声生成が同じジョブの文書を取得しても、読み込みは1回だけであることをテスト"""
+    from src.core import document_loader
+    
+    with patch.object(document_loader, '_load_document', new_callable=AsyncMock,
+                      return_value={'title': 'テスト文書'}) as mock_load, \
+         patch.dict(document_loader._cache, clear=True):
+        slides = await SlideGenerator()._get_document_data('test_job_id')
+        audio = await TTSEngine()._get_document_data('test_job_id')
+    
+    assert slides is audio
+    mock_load.assert_called_once_with('test_job_id')
 
 class TestTTSEngine:
     """TTSEngine のテストクラス"""
@@ -63,6 +204,16 @@ class TestTTSEngine:
         
         assert '分数' in result or 'frac' not in result
     
+    def test_convert_math_to_speech_longest_match(self):
+        """長いルールが優先され（'}{'や'\\lim_{'）、結果が正規表現版と一致することをテスト"""
+        from src.core.tts_engine import _MATH_SPEECH_MAP, _MATH_SPEECH_RE
+        
+        math_expr = r"\lim_{x \to 0} \frac{a}{b}"
+        result = self.engine._convert_math_to_speech(math_expr)
+        
+        assert result == 'リミット x が近づくとき 0 分数 a 分の b'
+        assert result == _MATH_SPEECH_RE.sub(lambda m: _MATH_SPEECH_MAP[m.group()], math_expr)
+    
     def test_prepare_text_for_tts(self):
         """TTS用テキスト準備をテスト"""
         document_data = {
@@ -82,6 +233,68 @@ class TestTTSEngine:
         assert '第1章' in result
         assert 'テスト内容です。' in result
     
+    @pytest.mark.asyncio
+    async def test_generate_audio_per_segment(self, tmp_path):
+        """タイトル・章ごとに音声合成し、連結することをテスト"""
+        provider = Mock()
+        provider.synthesize_text = AsyncMock()
+        self.engine.providers = {'google': provider}
+        
+        async def uncached_synthesize(provider, *args):
+            await provider.synthesize_text(*args)
+        
+        with patch('src.core.tts_engine.settings.output_dir', str(tmp_path)), \
+             patch('src.core.tts_engine.settings.temp_dir', str(tmp_path / 'temp')), \
+             patch.object(self.engine, '_cached_synthesize', side_effect=uncached_synthesize), \
+             patch.object(self.engine, '_concat_audio', new_callable=AsyncMock) as mock_concat:
+            result = await self.engine.generate_audio('test_job_id', voice='ja-JP-Wavenet-A')
+        
+        texts = [call.args[0] for call in provider.synthesize_text.call_args_list]
+        assert texts == self.engine._prepare_segments_for_tts(await self.engine._get_document_data('test_job_id'))
+        segment_paths, output_path = mock_concat.call_args.args
+        assert len(segment_paths) == len(texts)
+        assert str(output_path) == result
+    
+    @pytest.mark.asyncio
+    async def test_cached_synthesize(self, tmp_path):
+        """同じテキストの2回目の合成はキャッシュから返すことをテスト"""
+        async def fake_synthesize(text, output_path, voice):
+            output_path.write_bytes(text.encode('utf-8'))
+        
+        provider = Mock()
+        provider.synthesize_text = AsyncMock(side_effect=fake_synthesize)
+        
+        with patch('src.core.tts_engine.settings.tts_cache_dir', str(tmp_path / 'cache')):
+            await self.engine._cached_synthesize(provider, 'テスト', tmp_path / 'a.wav', 'ja-JP-Wavenet-A')
+            await self.engine._cached_synthesize(provider, 'テスト', tmp_path / 'b.wav', 'ja-JP-Wavenet-A')
+        
+        provider.synthesize_text.assert_called_once()
+        assert (tmp_path / 'b.wav').read_bytes() == 'テスト'.encode('utf-8')
+    
+    @pytest.mark.asyncio
+    async def test_concat_audio_keeps_linked_cache(self, tmp_path):
+        """出力先が合成キャッシュとハードリンクしていても、キャッシュの中身を書き換えないことをテスト"""
+        segment = tmp_path / "segment_0.wav"
+        segment.write_bytes(b"segment")
+        output_path = tmp_path / "job_audio.wav"
+        cache_path = tmp_path / "cache.wav"
+        cache_path.write_bytes(b"cached")
+        os.link(cache_path, output_path)
+        
+        async def fake_ffmpeg(*args, **kwargs):
+            # ffmpeg -y は既存の出力ファイルを開き直して上書きする
+            with open(args[-1], 'wb') as f:
+                f.write(b"concatenated")
+            process = Mock(returncode=0)
+            process.communicate = AsyncMock(return_value=(b"", b""))
+            return process
+        
+        with patch('src.core.tts_engine.asyncio.create_subprocess_exec', side_effect=fake_ffmpeg):
+            await self.engine._concat_audio([segment], output_path)
+        
+        assert output_path.read_bytes() == b"concatenated"
+        assert cache_path.read_bytes() == b"cached"
+    
     def test_select_provider_no_providers(self):
         """プロバイダーが利用できない場合のテスト"""
         engine = TTSEngine()
@@ -120,7 +333,61 @@ class TestVideoGenerator:
         
         # 不明な品質はデフォルト（1080p）になる
         assert config_unknown == config_1080p
-    
+
+    @pytest.mark.asyncio
+    async def test_pdf_to_images_renders_at_video_height(self, tmp_path):
+        """スライドを動画の高さのJPEGとして直接書き出すことをテスト"""
+        with patch('pdf2image.convert_from_path', return_value=['slide-1.jpg']) as mock_convert:
+            result = await self.generator._pdf_to_images(
+                'slides.pdf', self.generator._get_video_config('720p'), tmp_path
+            )
+
+        assert result == ['slide-1.jpg']
+        kwargs = mock_convert.call_args.kwargs
+        assert kwargs['output_folder'] == tmp_path
+        assert kwargs['size'] == (None, 720)
+        assert kwargs['fmt'] == 'jpeg'
+        assert kwargs['paths_only'] is True
+        assert kwargs['use_pdftocairo'] is True
+
+    @pytest.mark.asyncio
+    async def test_get_audio_duration_cached(self, tmp_path):
+        """ffprobeで長さを取得し、同じファイルは再度ffprobeを起動しないことをテスト"""
+        audio_path = tmp_path / 'audio.wav'
+        audio_path.write_bytes(b'RIFF')
+
+        process = Mock(returncode=0)
+        process.communicate = AsyncMock(return_value=(b'12.5\n', b''))
+        with patch('src.core.video_generator.asyncio.create_subprocess_exec',
+                   new_callable=AsyncMock, return_value=process) as mock_exec:
+            first = await self.generator._get_audio_duration(str(audio_path))
+            second = await self.generator._get_audio_duration(str(audio_path))
+
+        assert first == second == 12.5
+        mock_exec.assert_called_once()
+
+    def test_build_concat_list(self, tmp_path):
+        """concat demuxer用の一覧に表示時間が入り、最後のスライドが再度並ぶことをテスト"""
+        images = [str(tmp_path / 'slide-1.jpg'), str(tmp_path / "it's-2.jpg")]
+
+        result = self.generator._build_concat_list(images, [1.5, 2.0])
+
+        lines = result.splitlines()
+        assert lines[0] == f"file '{(tmp_path / 'slide-1.jpg').as_posix()}'"
+        assert lines[1] == 'duration 1.500'
+        assert lines[3] == 'duration 2.000'
+        assert lines[2] == lines[4]
+        assert "it'\\''s-2.jpg" in lines[4]
+
+    def test_detect_video_encoder_falls_back_to_libx264(self):
+        """一覧にあっても実際にエンコードできないハードウェアエンコーダーは使わないことをテスト"""
+        from src.core.video_generator import _detect_video_encoder
+
+        listed = Mock(stdout=' V....D h264_nvenc  NVIDIA NVENC H.264 encoder\n')
+        failed = Mock(returncode=1)
+        with patch('src.core.video_generator.subprocess.run', side_effect=[listed, failed]):
+            assert _detect_video_encoder.__wrapped__('ffmpeg') == 'libx264'
+
     def test_convert_chapters_to_ffmpeg_format(self):
         """FFmpeg章形式変換をテスト"""
         chapters = [
@@ -128,23 +395,11 @@ class TestVideoGenerator:
             {'title': '第2章', 'start_time': 60.0, 'end_time': 120.0}
         ]
         
-        # 一時ファイルを作成してテスト
-        import tempfile
-        import json
+        result = self.generator._convert_chapters_to_ffmpeg_format(chapters)
         
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as tmp:
-            json.dump(chapters, tmp, ensure_ascii=False)
-            tmp_path = Path(tmp.name)
-        
-        try:
-            result = self.generator._convert_chapters_to_ffmpeg_format(tmp_path)
-            
-            assert ';FFMETADATA1' in result
-            assert '[CHAPTER]' in result
-            assert '第1章' in result
-            assert '第2章' in result
-            assert 'START=0' in result
-            assert 'END=60000' in result  # ミリ秒
-            
-        finally:
-            tmp_path.unlink()
\ No newline at end of file
+        assert ';FFMETADATA1' in result
+        assert '[CHAPTER]' in result
+        assert '第1章' in result
+        assert '第2章' in result
+        assert 'START=0' in result
+        assert 'END=60000' in result  # ミリ秒
\ No newline at end of file
@@ -4,6 +4,7 @@ from pathlib import Path
 from unittest.mock import Mock, patch
 
 from src.core.document_parser import DocumentParser
+from src.core.chapter_detector import ChapterDetector
 
 class TestDocumentParser:
     """DocumentParser のテストクラス"""
@@ -80,6 +81,58 @@ class TestDocumentParser:
         assert any("lim" in expr for expr in math_expressions)
         assert any("int" in expr for expr in math_expressions)
     
+    def test_scan_text(self):
+        """章構造と数式の同時検出をテスト"""
+        text = r"""第1章 微分
+導関数 $f'(x)$ を定義する。
+$$\int_0^1 x dx$$
+
+第2章 積分
+"""
+        
+        chapters, math_expressions = self.parser._scan_text(text)
+        
+        assert chapters == self.parser._detect_chapters(text)
+        assert [c['line_number'] for c in chapters] == [0, 4]
+        assert math_expressions == ["f'(x)", r'\int_0^1 x dx']
+    
+    def test_scan_text_math_in_heading(self):
+        """見出し行の中の数式も抽出されることをテスト"""
+        chapters, math_expressions = self.parser._scan_text("1. The function $f(x)$ is smooth\n第1章 $x^2$\n")
+        
+        assert len(chapters) == 2
+        assert math_expressions == ['f(x)', 'x^2']
+    
+    def test_scan_text_heading_inside_multiline_math(self):
+        """行をまたぐ$...$があっても章見出しが検出されることをテスト"""
+        text = "Price $5 and\n第2章 積分\nthen $10"
+        
+        chapters, math_expressions = self.parser._scan_text(text)
+        
+        assert [c['title'] for c in chapters] == ['積分']
+        assert chapters == self.parser._detect_chapters(text)
+        assert math_expressions == self.parser._extract_math_expressions(text)
+    
+    def test_detect_chapters_unicode_whitespace(self):
+        """全角数字・全角スペースの章見出しをテスト（re2利用時も同じ結果になること）"""
+        text = "第１章\u3000序論\n\\begin{equation} x"
+        
+        chapters, math_expressions = self.parser._scan_text(text)
+        
+        assert [c['title'] for c in chapters] == ['序論']
+        assert math_expressions == []
+    
+    def test_extract_latex_math(self):
+        """LaTeX数式が出現順に重複なく抽出されることをテスト"""
+        content = r"""
+        $$a^2$$ と \begin{eqnarray}b\end{eqnarray}
+        \begin{equation}c = $d$\end{equation} および $e$
+        """
+        
+        math_expressions = self.parser._extract_latex_math(content)
+        
+        assert math_expressions == ['a^2', 'b', 'c = $d$', 'e']
+    
     def test_extract_latex_command(self):
         """LaTeXコマンド抽出をテスト"""
         content = r"\title{数学解析の基礎}\author{山田太郎}"
@@ -146,4 +199,48 @@ class TestDocumentParser:
             assert len(result['math_expressions']) >= 1
             
         finally:
-            tmp_path.unlink()
\ No newline at end of file
+            tmp_path.unlink()
+
+class TestChapterDetector:
+    """ChapterDetector のテストクラス"""
+    
+    def setup_method(self):
+        self.detector = ChapterDetector()
+    
+    def test_match_chapter_pattern_types(self):
+        """各パターンの種類・レベル・番号の判定をテスト"""
+        cases = [
+            ('第1章 微分積分学', 'chapter', 1, '1', '微分積分学'),
+            ('Section 2: Limits', 'section', 2, '2', 'Limits'),
+            ('1.2.3 詳細', 'subsubsection', 4, '1', '詳細'),
+            ('定理 3: 平均値の定理', 'theorem', 3, '3', '平均値の定理'),
+            (r'\subsection{定義}', 'subsection', 3, '定義', '定義'),
+        ]
+        
+        for line, chapter_type, level, number, title in cases:
+            info = self.detector._match_chapter_pattern(line, 0)
+            assert info['type'] == chapter_type
+            assert info['level'] == level
+            assert info['number'] == number
+            assert info['title'] == title
+        
+        assert self.detector._match_chapter_pattern('普通の文章です。', 0) is None
+    
+    def test_detect_chapters_hierarchy(self):
+        """チャプターの階層構造をテスト"""
+        text = """第1章 微分
+第1節 極限
+1.1 定義
+本文
+
+Chapter 2: Algebra
+"""
+        
+        chapters = self.detector.detect_chapters(text)
+        
+        assert [c['title'] for c in chapters] == ['微分', 'Algebra']
+        section = chapters[0]['children'][0]
+        assert section['title'] == '極限'
+        assert section['children'][0]['title'] == '定義'
+        assert chapters[0]['start_time'] == 0.0
+        assert chapters[0]['end_time'] == chapters[1]['start_time']
@@ -0,0 +1,309 @@
+import os
+import pytest
+from pathlib import Path
+from unittest.mock import patch
+
+from src.utils.file_manager import FileManager, link_or_copy
+from src.utils.math_renderer import MathRenderer
+from src.utils.pdf_processor import PDFProcessor
+
+def make_pdf(path: Path, texts, padding: int = 0) -> Path:
+    """1ページに1つずつテキストを描いたPDFを作成（paddingで内容の前後にコメントを詰める）"""
+    from pypdf import PdfWriter
+    from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+    
+    writer = PdfWriter()
+    font = DictionaryObject({
+        NameObject('/Type'): NameObject('/Font'),
+        NameObject('/Subtype'): NameObject('/Type1'),
+        NameObject('/BaseFont'): NameObject('/Helvetica')
+    })
+    pad = b"%" * padding + b"\n"
+    for text in texts:
+        page = writer.add_blank_page(612, 792)
+        stream = DecodedStreamObject()
+        stream.set_data(pad + f"BT /F1 24 Tf 72 700 Td ({text}) Tj ET\n".encode() + pad)
+        page.replace_contents(stream)
+        page[NameObject('/Resources')] = DictionaryObject({
+            NameObject('/Font'): DictionaryObject({NameObject('/F1'): font})
+        })
+    
+    with open(path, 'wb') as f:
+        writer.write(f)
+    return path
+
+class TestFileManager:
+    """FileManager のテストクラス"""
+    
+    def test_backup_and_restore_round_trip(self, tmp_path):
+        """バックアップから元の内容に戻せることをテスト"""
+        manager = FileManager(tmp_path)
+        source = tmp_path / "data.txt"
+        source.write_bytes(b"original")
+        
+        backup_path = manager.backup_file(source)
+        source.write_bytes(b"modified")
+        
+        assert manager.restore_file(backup_path, source)
+        assert source.read_bytes() == b"original"
+    
+    def test_backup_is_independent_copy(self, tmp_path):
+        """既定のバックアップは元ファイルと中身を共有しないことをテスト"""
+        manager = FileManager(tmp_path)
+        source = tmp_path / "data.txt"
+        source.write_bytes(b"original")
+        
+        backup_path = manager.backup_file(source)
+        
+        assert not os.path.samefile(source, backup_path)
+        with open(source, 'r+b') as f:
+            f.write(b"OVERWRITE")
+        assert backup_path.read_bytes() == b"original"
+    
+    def test_backup_same_second_keeps_source(self, tmp_path):
+        """同じ秒に繰り返しバックアップしても、元ファイルも既存のバックアップも壊さないことをテスト"""
+        manager = FileManager(tmp_path)
+        source = tmp_path / "data.txt"
+        source.write_bytes(b"first")
+        
+        first = manager.backup_file(source, prefer_links=True)
+        source.write_bytes(b"second")
+        second = manager.backup_file(source)
+        
+        assert first != second
+        assert source.read_bytes() == b"second"
+        assert second.read_bytes() == b"second"
+    
+    def test_restore_onto_linked_backup(self, tmp_path):
+        """ハードリンクのバックアップを元の場所に復元できることをテスト"""
+        manager = FileManager(tmp_path)
+        source = tmp_path / "data.txt"
+        source.write_bytes(b"original")
+        
+        backup_path = manager.backup_file(source, prefer_links=True)
+        
+        assert manager.restore_file(backup_path, source)
+        assert source.read_bytes() == b"original"
+    
+    def test_link_or_copy_onto_linked_destination(self, tmp_path):
+        """ハードリンク済みの出力先に複製しても、リンク元の中身を書き換えないことをテスト"""
+        cache_path = tmp_path / "cache.bin"
+        cache_path.write_bytes(b"cached")
+        dst = tmp_path / "out.bin"
+        os.link(cache_path, dst)
+        
+        new_src = tmp_path / "new.bin"
+        new_src.write_bytes(b"new")
+        link_or_copy(new_src, dst)
+        
+        assert dst.read_bytes() == b"new"
+        assert cache_path.read_bytes() == b"cached"
+    
+    def test_link_or_copy_falls_back_to_copy(self, tmp_path):
+        """ハードリンクできなければコピーすることをテスト"""
+        src = tmp_path / "src.bin"
+        src.write_bytes(b"data")
+        dst = tmp_path / "dst.bin"
+        dst.write_bytes(b"old")
+        
+        with patch('src.utils.file_manager.os.link', side_effect=OSError):
+            link_or_copy(src, dst)
+        
+        assert dst.read_bytes() == b"data"
+        assert not os.path.samefile(src, dst)
+    
+    def test_archive_job_files_contents(self, tmp_path):
+        """ジョブのファイルとマニフェストがアーカイブに入り、圧縮済み形式は無圧縮で格納されることをテスト"""
+        import json
+        import zipfile
+        
+        manager = FileManager(tmp_path)
+        (manager.upload_dir / "job1.pdf").write_bytes(b"%PDF upload")
+        (manager.output_dir / "job1.mp4").write_bytes(b"video" * 100)
+        (manager.output_dir / "job1_slides.tex").write_text("\\section{A}" * 100)
+        (manager.output_dir / "job2.mp4").write_bytes(b"other job")
+        
+        archive_path = manager.archive_job_files("job1")
+        
+        with zipfile.ZipFile(archive_path) as zipf:
+            infos = {info.filename: info for info in zipf.infolist()}
+            assert set(infos) == {
+                "uploads/job1.pdf", "outputs/job1.mp4", "outputs/job1_slides.tex", "job1_manifest.json"
+            }
+            assert zipf.read("outputs/job1.mp4") == b"video" * 100
+            assert infos["outputs/job1.mp4"].compress_type == zipfile.ZIP_STORED
+            assert infos["outputs/job1_slides.tex"].compress_type == zipfile.ZIP_DEFLATED
+            
+            manifest = json.loads(zipf.read("job1_manifest.json"))
+            assert manifest['job_id'] == "job1"
+            assert sorted(f['filename'] for f in manifest['files']['outputs']) == ["job1.mp4", "job1_slides.tex"]
+    
+    def test_cleanup_removes_stale_symlinks(self, tmp_path):
+        """古いシンボリックリンクはリンクだけが削除され、リンク先は残ることをテスト"""
+        import time
+        
+        manager = FileManager(tmp_path)
+        target = tmp_path / "target.mp4"
+        target.write_bytes(b"video")
+        old_link = manager.output_dir / "job1.mp4"
+        old_link.symlink_to(target)
+        new_link = manager.output_dir / "job2.mp4"
+        new_link.symlink_to(target)
+        old_ts = time.time() - 30 * 86400
+        os.utime(old_link, (old_ts, old_ts), follow_symlinks=False)
+        
+        counts = manager.cleanup_old_files(max_age_days=7)
+        
+        assert counts['outputs'] == 1
+        assert not old_link.is_symlink()
+        assert new_link.is_symlink()
+        assert target.read_bytes() == b"video"
+    
+    def test_verify_manifest_unreadable_entry(self, tmp_path):
+        """開けないエントリ（ディレクトリに置き換わったもの）は不一致となり、検証全体は止まらないことをテスト"""
+        import json
+        
+        manager = FileManager(tmp_path)
+        good = manager.output_dir / "job1.mp4"
+        good.write_bytes(b"video")
+        (manager.output_dir / "job1_slides.tex").mkdir()
+        manifest_path = tmp_path / "manifest.json"
+        manifest_path.write_text(json.dumps({'files': {'outputs': [
+            {'filename': "job1.mp4", 'hash': manager.get_file_hash(good)},
+            {'filename': "job1_slides.tex", 'hash': "0" * 64},
+        ]}}))
+        
+        assert manager.verify_manifest(manifest_path) == {
+            "outputs/job1.mp4": True,
+            "outputs/job1_slides.tex": False,
+        }
+
+class TestMathRenderer:
+    """MathRenderer のテストクラス"""
+    
+    def setup_method(self):
+        self.renderer = MathRenderer()
+    
+    def test_render_multiple_expressions_reuses_cache(self, tmp_path):
+        """同じ数式は1回だけ描画し、2回目以降は描画キャッシュから複製することをテスト"""
+        self.renderer._render_cache_dir = tmp_path / "cache"
+        self.renderer._render_cache_dir.mkdir()
+        expressions = ['x^2 + y^2', '\\frac{a}{b}', 'x^2 + y^2']
+        
+        with patch.object(self.renderer, '_render', wraps=self.renderer._render) as mock_render:
+            first = self.renderer.render_multiple_expressions(expressions, tmp_path / "first")
+            second = self.renderer.render_multiple_expressions(expressions, tmp_path / "second")
+        
+        assert len(first) == len(second) == 3
+        assert mock_render.call_count == 2
+        assert Path(first[0]).read_bytes() == Path(first[2]).read_bytes() == Path(second[0]).read_bytes()
+        assert Path(first[0]).read_bytes() != Path(first[1]).read_bytes()
+        assert Path(first[0]).read_bytes().startswith(b"\x89PNG")
+    
+    def test_render_cache_keyed_by_size(self, tmp_path):
+        """DPIやフォントサイズが違えば別に描画することをテスト"""
+        self.renderer._render_cache_dir = tmp_path / "cache"
+        self.renderer._render_cache_dir.mkdir()
+        
+        with patch.object(self.renderer, '_render', wraps=self.renderer._render) as mock_render:
+            assert self.renderer.render_latex_to_image('x^2', tmp_path / "a.png", dpi=100)
+            assert self.renderer.render_latex_to_image('x^2', tmp_path / "b.png", dpi=200)
+        
+        assert mock_render.call_count == 2
+        assert (tmp_path / "a.png").read_bytes() != (tmp_path / "b.png").read_bytes()
+    
+    def test_render_figure_fallback_reused(self, tmp_path):
+        """mathtextで描けない場合は使い回しのFigureで描画し、前の数式が残らないことをテスト"""
+        with patch.object(self.renderer, '_render_mathtext', side_effect=ValueError):
+            self.renderer._render('x^2', tmp_path / "a.png", 100, 14)
+            figure = self.renderer._figure
+            self.renderer._render('y', tmp_path / "b.png", 100, 14)
+            self.renderer._render('x^2', tmp_path / "c.png", 100, 14)
+        
+        assert self.renderer._figure is figure
+        assert (tmp_path / "a.png").read_bytes() == (tmp_path / "c.png").read_bytes()
+        assert (tmp_path / "a.png").read_bytes() != (tmp_path / "b.png").read_bytes()
+
+class TestPDFProcessor:
+    """PDFProcessor のテストクラス"""
+    
+    @pytest.fixture(autouse=True)
+    def pdf_cache_dir(self, tmp_path):
+        with patch('src.utils.pdf_processor.settings.pdf_cache_dir', str(tmp_path / 'cache')):
+            yield tmp_path / 'cache'
+    
+    def test_extract_text_cache_hit(self, tmp_path):
+        """2回目の抽出はメモリ・ディスクのキャッシュから返し、ページを解析し直さないことをテスト"""
+        pdf_path = make_pdf(tmp_path / "a.pdf", ["HELLO", "WORLD"])
+        processor = PDFProcessor()
+        
+        with patch.object(PDFProcessor, '_process_pages', wraps=processor._process_pages) as mock_process:
+            first = processor.extract_text(pdf_path)
+            second = processor.extract_text(pdf_path)
+            # 別のインスタンスでもディスクキャッシュから返す
+            third = PDFProcessor().extract_text(pdf_path)
+        
+        assert first == second == third == "HELLO\nWORLD\n"
+        assert mock_process.call_count == 1
+    
+    def test_extract_text_cache_miss_same_size(self, tmp_path):
+        """サイズも先頭・末尾も同じで中身だけ違うPDFを、別の内容として解析することをテスト"""
+        first_path = make_pdf(tmp_path / "a.pdf", ["HELLO"], padding=200 * 1024)
+        second_path = make_pdf(tmp_path / "b.pdf", ["WORLD"], padding=200 * 1024)
+        assert first_path.stat().st_size == second_path.stat().st_size
+        
+        assert PDFProcessor().extract_text(first_path) == "HELLO\n"
+        assert PDFProcessor().extract_text(second_path) == "WORLD\n"
+    
+    def test_extract_text_cache_miss_after_rewrite(self, tmp_path):
+        """同じパスのPDFを書き換えたら解析し直すことをテスト"""
+        pdf_path = make_pdf(tmp_path / "a.pdf", ["HELLO"])
+        processor = PDFProcessor()
+        assert processor.extract_text(pdf_path) == "HELLO\n"
+        
+        make_pdf(pdf_path, ["WORLD"])
+        os.utime(pdf_path, ns=(0, 0))
+        
+        assert processor.extract_text(pdf_path) == "WORLD\n"
+    
+    @pytest.mark.parametrize('use_pymupdf', [False, True])
+    def test_extract_bookmarks_levels_and_pages(self, tmp_path, use_pymupdf):
+        """入れ子のブックマークの階層と（1始まりの）ページ番号をテスト"""
+        from pypdf import PdfReader, PdfWriter
+        from src.utils import pdf_processor
+        
+        if use_pymupdf and not pdf_processor.PYMUPDF_AVAILABLE:
+            pytest.skip("PyMuPDF is not installed")
+        
+        pdf_path = make_pdf(tmp_path / "plain.pdf", ["ONE", "TWO", "THREE"])
+        writer = PdfWriter(clone_from=PdfReader(pdf_path))
+        intro = writer.add_outline_item("Intro", 0)
+        writer.add_outline_item("Sub", 1, parent=intro)
+        writer.add_outline_item("End", 2)
+        outline_path = tmp_path / "outline.pdf"
+        with open(outline_path, 'wb') as f:
+            writer.write(f)
+        
+        with patch.object(pdf_processor, 'PYMUPDF_AVAILABLE', use_pymupdf):
+            bookmarks = PDFProcessor().extract_bookmarks(outline_path)
+        
+        assert bookmarks == [
+            {'title': 'Intro', 'level': 0, 'page': 1},
+            {'title': 'Sub', 'level': 1, 'page': 2},
+            {'title': 'End', 'level': 0, 'page': 3}
+        ]
+    
+    def test_process_pages_parallel_keeps_order(self, tmp_path):
+        """ページ範囲ごとに共有プロセスプールで処理しても、結果がページ順に並ぶことをテスト"""
+        from src.utils import pdf_processor, process_pool
+        
+        texts = ["ONE", "TWO", "THREE", "FOUR", "FIVE"]
+        pdf_path = make_pdf(tmp_path / "a.pdf", texts)
+        
+        with patch.object(pdf_processor, '_PAGES_PER_TASK', 2), \
+             patch.object(process_pool.settings, 'process_workers', 2):
+            pages = PDFProcessor()._process_pages(pdf_path, 'text')
+            pool = process_pool.get_process_pool()
+        
+        assert [page.strip() for page in pages] == texts
+        assert pool is process_pool.get_process_pool()